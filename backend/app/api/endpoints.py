@@ -2,22 +2,33 @@
 import sqlite3
 import traceback
 import os
+import re
+import pathlib
+import asyncio
+import threading
+import contextlib
 import pandas as pd
 import numpy as np
 from fastapi import APIRouter, Query, HTTPException
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
+from cachetools import TTLCache
 
+from app.core.serialization import NumpyORJSONResponse, PydanticResponse
 from app.services import analysis
 from app.services import prediction
 from app.services import news
 
-# --- Pydantic Models (Unchanged) ---
-class StockSearchResponse(BaseModel):
+# --- Pydantic Models ---
+class _ResponseModel(BaseModel):
+    # Response models are built once per request and never modified afterwards
+    model_config = ConfigDict(frozen=True, extra='ignore', validate_assignment=False)
+
+class StockSearchResponse(_ResponseModel):
     symbol: str
     name: str
 
-class StockInfo(BaseModel):
+class StockInfo(_ResponseModel):
     symbol: str
     shortName: Optional[str] = None
     longName: Optional[str] = None
@@ -29,7 +40,10 @@ class StockInfo(BaseModel):
     dayLow: Optional[float] = None
     previousClose: Optional[float] = None
 
-class Statistics(BaseModel):
+class Statistics(_ResponseModel):
+    # The percentiles are filled by their "25_percentile"-style keys as well as their field names
+    model_config = ConfigDict(populate_by_name=True)
+
     start_date: Optional[str] = None
     end_date: Optional[str] = None
     mean: Optional[float] = None
@@ -56,166 +70,345 @@ class Statistics(BaseModel):
     prob_2_days_up_streak: Optional[float] = None
     prob_2_days_down_streak: Optional[float] = None
 
-class LongTermPrediction(BaseModel):
+class LongTermPrediction(_ResponseModel):
     forecast_1y: Optional[float] = None
     recommendation: str
     confidence: Optional[float] = None
 
-class ShortTermPrediction(BaseModel):
+class ShortTermPrediction(_ResponseModel):
     forecast_7d_percent: Optional[float] = None
     recommendation: str
     confidence: Optional[float] = None
 
-class IntradayPrediction(BaseModel):
+class IntradayPrediction(_ResponseModel):
     last_updated: str
     similar_pattern_found: str
     prediction: str
     probability: Optional[float] = None
 
-class AIPredictions(BaseModel):
+class AIPredictions(_ResponseModel):
     long_term: LongTermPrediction
     short_term: ShortTermPrediction
     intraday: IntradayPrediction
 
-class NewsArticle(BaseModel):
+class NewsArticle(_ResponseModel):
     source: str
     headline: str
     sentiment_score: Optional[float] = None
     sentiment_label: Optional[str] = None
 
-class StockNewsSentiment(BaseModel):
+class StockNewsSentiment(_ResponseModel):
     articles: List[NewsArticle]
     overall_sentiment: str
 
-class GlobalMarketSentiment(BaseModel):
+class GlobalMarketSentiment(_ResponseModel):
     overall_market_sentiment: str
     trending_topic: str
     key_headlines: List[str]
 
-class NewsSentiment(BaseModel):
+class NewsSentiment(_ResponseModel):
     stock_news: StockNewsSentiment
     global_market: GlobalMarketSentiment
 
-class HistoricalDataPoint(BaseModel):
-    date: str
-    close: float
+class HistoricalSeries(_ResponseModel):
+    dates: List[str]
+    closes: List[float]
 
-class AnalysisResponse(BaseModel):
+class ReturnHistogram(_ResponseModel):
+    bin_edges: List[float]
+    counts: List[int]
+
+class AnalysisResponse(_ResponseModel):
     stock_info: StockInfo
     statistics: Statistics
     ai_predictions: AIPredictions
     news_sentiment: NewsSentiment
-    historical_data: List[HistoricalDataPoint]
-    daily_returns_histogram: List[float]
+    historical_data: HistoricalSeries
+    daily_returns_histogram: ReturnHistogram
 
-# --- Router Setup (Unchanged) ---
+# --- Router Setup ---
 router = APIRouter(prefix="/api", tags=["API"])
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_FILE_PATH = os.path.join(base_dir, "data", "stocks.db")
+# Opened read-only: the web app never writes stocks.db (setup_db.py rebuilds it offline)
+# as_uri() percent-escapes the path, so a "?", "#" or "%" in it can't cut off the query
+DB_URI = pathlib.Path(DB_FILE_PATH).resolve().as_uri() + "?mode=ro&immutable=1"
 
 def get_db_connection():
     try:
-        conn = sqlite3.connect(DB_FILE_PATH)
+        conn = sqlite3.connect(DB_URI, uri=True)
         conn.row_factory = sqlite3.Row
         return conn
     except sqlite3.Error as e:
         print(f"Database connection error path used: {DB_FILE_PATH}")
         raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
 
+# --- Search Index ---
+# The stock list only changes when setup_db.py is re-run, so /search is answered from memory:
+# every row is filed under the 1-3 character prefixes of each word in its symbol and name.
+SEARCH_PREFIX_LENGTH = 3
+SEARCH_RESULT_LIMIT = 10
+_TOKEN_RE = re.compile(r"\w+")
+
+class _SearchEntry:
+    __slots__ = ("result", "tokens")
+
+    def __init__(self, symbol: str, name: str):
+        self.result = {"symbol": symbol, "name": name}
+        self.tokens = _TOKEN_RE.findall(f"{symbol} {name}".lower())
+
+_search_index: Optional[Dict[str, List[_SearchEntry]]] = None
+_stock_names: Dict[str, str] = {}
+_index_lock = threading.Lock()
+
+def load_search_index() -> Dict[str, List[_SearchEntry]]:
+    """Builds the prefix index from the stocks table (once). Blocking: call it via asyncio.to_thread."""
+    global _search_index, _stock_names
+    with _index_lock:
+        if _search_index is not None:
+            return _search_index
+        # The only query the API runs, so the connection isn't kept open afterwards
+        with contextlib.closing(get_db_connection()) as conn:
+            rows = conn.execute("SELECT symbol, name FROM stocks ORDER BY rowid").fetchall()
+        index: Dict[str, List[_SearchEntry]] = {}
+        names: Dict[str, str] = {}
+        for row in rows:
+            names[row["symbol"]] = row["name"]
+            entry = _SearchEntry(row["symbol"], row["name"])
+            prefixes = {token[:n] for token in entry.tokens for n in range(1, SEARCH_PREFIX_LENGTH + 1)}
+            for prefix in prefixes:
+                index.setdefault(prefix, []).append(entry)
+        _stock_names = names
+        _search_index = index
+        return _search_index
+
+def lookup_stock_name(symbol: str) -> Optional[str]:
+    """Company name from stocks.db, if the symbol is listed there. Blocking on first use."""
+    if _search_index is None:
+        load_search_index()
+    return _stock_names.get(symbol)
+
+def reload_search_index():
+    """Drops the in-memory index; the next search rebuilds it from stocks.db."""
+    global _search_index
+    with _index_lock:
+        _search_index = None
+
+def _search_matches(index: Dict[str, List[_SearchEntry]], q: str) -> List[Dict[str, str]]:
+    # Every word of the query has to start some word of the symbol or name
+    query_tokens = _TOKEN_RE.findall(q.lower())
+    if not query_tokens:
+        return []
+    key_token = max(query_tokens, key=len)
+    results = []
+    for entry in index.get(key_token[:SEARCH_PREFIX_LENGTH], ()):
+        if all(any(token.startswith(qt) for token in entry.tokens) for qt in query_tokens):
+            results.append(entry.result)
+            if len(results) == SEARCH_RESULT_LIMIT:
+                break
+    return results
+
 # --- API Endpoints ---
-@router.get("/search", response_model=List[StockSearchResponse])
+@router.get("/search", response_model=List[StockSearchResponse], response_class=NumpyORJSONResponse)
 async def search_stocks(q: Optional[str] = Query(None, min_length=2, description="Search query")):
     if q is None: return []
-    search_query = f"%{q}%"
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT symbol, name FROM stocks WHERE symbol LIKE ? OR name LIKE ? LIMIT 10", (search_query, search_query))
-        stocks = cursor.fetchall()
-        return [dict(row) for row in stocks]
+        index = _search_index
+        if index is None:
+            index = await asyncio.to_thread(load_search_index)
+        return NumpyORJSONResponse(content=_search_matches(index, q))
     except Exception as e:
         print(f"Error during search: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"An error occurred during search: {str(e)}")
-    finally:
-        if conn: conn.close()
 
-@router.get("/analyze", response_model=AnalysisResponse)
+# --- Response Caches ---
+class CoalescingTTLCache:
+    """
+    TTL cache for async handlers. On a miss, the first request builds the entry
+    while concurrent requests for the same key wait for it instead of rebuilding it.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.waiters: Dict[str, int] = {} # Requests holding or waiting on each key's lock
+
+    async def get_or_build(self, key: str, builder, *args):
+        """Returns the cached value for key, awaiting builder(*args) to create it on a miss."""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                value = self.cache.get(key)
+                if value is None:
+                    value = await builder(*args)
+                    self.cache[key] = value
+                return value
+        finally:
+            # The last request out drops the lock, keeping the dicts bounded. Dropping it
+            # while others still wait would let a newcomer create a second lock for the key.
+            self.waiters[key] -= 1
+            if self.waiters[key] == 0 and self.locks.get(key) is lock:
+                del self.waiters[key]
+                del self.locks[key]
+
+# History, statistics and the model-based predictions barely move intraday,
+# while the intraday prediction and the news are refreshed every minute.
+SLOW_CACHE_TTL = 3600
+FAST_CACHE_TTL = 60
+slow_section_cache = CoalescingTTLCache(maxsize=256, ttl=SLOW_CACHE_TTL)
+fast_section_cache = CoalescingTTLCache(maxsize=256, ttl=FAST_CACHE_TTL)
+
+async def build_slow_section(symbol: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+    """
+    Fetches and cleans the history, then computes everything derived from it:
+    stock info, statistics, long/short-term predictions and the chart series.
+    """
+    # 1. Fetch Data
+    # The service calls below block (network, disk, pandas), so they run in worker threads
+    (hist_data, info_data), profile, listed_name = await asyncio.gather(
+        analysis.aget_stock_data(symbol, start_date=start_date, end_date=end_date),
+        analysis.aget_company_profile(symbol),
+        asyncio.to_thread(lookup_stock_name, symbol)
+    )
+    if not isinstance(info_data, dict): info_data = {'symbol': symbol}
+    short_name = profile.get('shortName') or listed_name
+    long_name = profile.get('longName') or listed_name
+
+    # 2. Clean Data ONCE
+    # get_stock_data() returns a frame private to this request, so it's cleaned in place (no extra copy)
+    if not isinstance(hist_data.index, pd.DatetimeIndex):
+         hist_data.index = pd.to_datetime(hist_data.index, format='ISO8601', errors='coerce', cache=True)
+         hist_data.dropna(axis=0, subset=[hist_data.index.name], inplace=True)
+
+    hist_data['Close'] = pd.to_numeric(hist_data['Close'], errors='coerce')
+    hist_data.dropna(axis=0, subset=['Close'], inplace=True) # Drop rows where Close is NaN
+
+    if hist_data.empty:
+        raise HTTPException(status_code=404, detail="No valid historical data to analyze after cleaning.")
+
+    # 3. Calculate Statistics and 4. Get AI Predictions (using the CLEANED hist_data)
+    # None of these modify hist_data, so they read it concurrently
+    (stats_dict, returns_histogram), long_term_pred_dict, short_term_pred_dict = await asyncio.gather(
+        asyncio.to_thread(analysis.calculate_statistics, hist_data),
+        asyncio.to_thread(prediction.get_long_term_prediction, hist_data, symbol),
+        asyncio.to_thread(prediction.get_short_term_prediction, hist_data, symbol)
+    )
+
+    # 5. Format Historical Data for Charting (using the CLEANED hist_data)
+    # Sent as two parallel arrays; orjson writes the closes straight from the numpy buffer.
+    # tz_localize(None) keeps the exchange-local date (a tz-aware index would cast via UTC).
+    historical_data = HistoricalSeries.model_construct(
+        dates=hist_data.index.tz_localize(None).values.astype('datetime64[D]').astype('U10').tolist(),
+        closes=hist_data['Close'].to_numpy(dtype=np.float64)
+    )
+
+    # 6. Stock Info
+    latest_close_price = hist_data['Close'].iloc[-1] if not hist_data.empty else None
+    prev_close_price = hist_data['Close'].iloc[-2] if len(hist_data) > 1 else None
+
+    stock_info = StockInfo.model_construct(
+        symbol=info_data.get('symbol', symbol),
+        shortName=short_name, longName=long_name,
+        sector=profile.get('sector'), industry=profile.get('industry'),
+        marketCap=info_data.get('marketCap'),
+        currentPrice=latest_close_price, # Use reliable price
+        dayHigh=hist_data['High'].iloc[-1] if 'High' in hist_data.columns and not hist_data.empty else info_data.get('dayHigh'),
+        dayLow=hist_data['Low'].iloc[-1] if 'Low' in hist_data.columns and not hist_data.empty else info_data.get('dayLow'),
+        previousClose=prev_close_price if prev_close_price else info_data.get('previousClose')
+    )
+
+    # model_construct skips validation: these values come from our own services
+    return {
+        "stock_info": stock_info,
+        "statistics": Statistics.model_construct(**stats_dict),
+        "long_term": LongTermPrediction.model_construct(**long_term_pred_dict),
+        "short_term": ShortTermPrediction.model_construct(**short_term_pred_dict),
+        "historical_data": historical_data,
+        "daily_returns_histogram": ReturnHistogram.model_construct(**returns_histogram)
+    }
+
+async def build_fast_section(symbol: str) -> Dict[str, Any]:
+    """Intraday prediction, today's bar, and stock and market news sentiment, fetched concurrently."""
+    # The intraday placeholder is instant, so it isn't worth a thread.
+    # Only the stock's news needs the company name, so the market news doesn't wait for it.
+    async def stock_news():
+        return await news.aget_news_and_sentiment(symbol, await get_company_name(symbol))
+
+    stock_news_dict, global_market_dict, live_bar = await asyncio.gather(
+        stock_news(),
+        news.aget_global_market_sentiment(),
+        analysis.aget_live_bar(symbol)
+    )
+    intraday_pred_dict = prediction.get_intraday_prediction(symbol)
+    return {
+        "live_bar": live_bar,
+        "intraday": IntradayPrediction.model_construct(**intraday_pred_dict),
+        "stock_news": StockNewsSentiment.model_construct(
+            articles=[NewsArticle.model_construct(**article) for article in stock_news_dict['articles']],
+            overall_sentiment=stock_news_dict['overall_sentiment']
+        ),
+        "global_market": GlobalMarketSentiment.model_construct(**global_market_dict)
+    }
+
+async def get_company_name(symbol: str) -> str:
+    """
+    Name used to pick the stock's news: from stocks.db, else Yahoo's profile, else the symbol.
+    The profile is the one build_slow_section fetches; analysis caches it (briefly, if the fetch failed)
+    and fetches it once for concurrent callers.
+    """
+    if _search_index is None:
+        await asyncio.to_thread(load_search_index)
+    listed_name = lookup_stock_name(symbol) # In memory once the index is loaded
+    if listed_name:
+        return listed_name
+    profile = await analysis.aget_company_profile(symbol)
+    return profile.get('shortName') or profile.get('longName') or symbol
+
+@router.get("/analyze", response_model=AnalysisResponse, response_class=PydanticResponse)
 async def analyze_stock(
     symbol: str = Query(..., description="Stock symbol (e.g., RELIANCE.NS)"),
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
 ):
     try:
-        # 1. Fetch Data
-        hist_data_raw, info_data = analysis.get_stock_data(symbol, start_date=start_date, end_date=end_date)
-        if not isinstance(info_data, dict): info_data = {'symbol': symbol}
-
-        # --- THIS IS THE FIX ---
-        # 2. Clean Data ONCE
-        if not isinstance(hist_data_raw.index, pd.DatetimeIndex):
-             hist_data_raw.index = pd.to_datetime(hist_data_raw.index, errors='coerce')
-             hist_data_raw.dropna(axis=0, subset=[hist_data_raw.index.name], inplace=True)
-        
-        hist_data = hist_data_raw.copy()
-        hist_data['Close'] = pd.to_numeric(hist_data['Close'], errors='coerce')
-        hist_data.dropna(axis=0, subset=['Close'], inplace=True) # Drop rows where Close is NaN
-
-        if hist_data.empty:
-            raise HTTPException(status_code=404, detail="No valid historical data to analyze after cleaning.")
-        # --- END FIX ---
-
-        # 3. Calculate Statistics (using the CLEANED hist_data)
-        stats_dict, daily_returns_list = analysis.calculate_statistics(hist_data)
-
-        # 4. Get AI Predictions (using the CLEANED hist_data)
-        long_term_pred_dict = prediction.get_long_term_prediction(hist_data, symbol)
-        short_term_pred_dict = prediction.get_short_term_prediction(hist_data, symbol)
-        intraday_pred_dict = prediction.get_intraday_prediction(symbol)
-
-        # 5. Get News & Sentiment (Unchanged)
-        company_name = info_data.get('shortName', info_data.get('longName', symbol))
-        stock_news_dict = news.get_news_and_sentiment(symbol, company_name)
-        global_market_dict = news.get_global_market_sentiment()
-
-        # 6. Format Historical Data for Charting (using the CLEANED hist_data)
-        hist_data_chart = hist_data[['Close']].copy()
-        hist_data_chart.index.name = 'Date'
-        hist_data_chart.reset_index(inplace=True)
-        hist_data_chart['date'] = hist_data_chart['Date'].dt.strftime('%Y-%m-%d') # Format date as string
-        hist_data_chart.rename(columns={'Close': 'close'}, inplace=True)
-        historical_data_list = hist_data_chart[['date', 'close']].to_dict(orient='records') # Send clean list
-
-        # 7. Format Full Response
-        latest_close_price = hist_data['Close'].iloc[-1] if not hist_data.empty else None
-        prev_close_price = hist_data['Close'].iloc[-2] if len(hist_data) > 1 else None
-
-        stock_info = StockInfo(
-            symbol=info_data.get('symbol', symbol),
-            shortName=info_data.get('shortName'), longName=info_data.get('longName'),
-            sector=info_data.get('sector'), industry=info_data.get('industry'),
-            marketCap=info_data.get('marketCap'),
-            currentPrice=latest_close_price, # Use reliable price
-            dayHigh=hist_data['High'].iloc[-1] if 'High' in hist_data.columns and not hist_data.empty else info_data.get('dayHigh'),
-            dayLow=hist_data['Low'].iloc[-1] if 'Low' in hist_data.columns and not hist_data.empty else info_data.get('dayLow'),
-            previousClose=prev_close_price if prev_close_price else info_data.get('previousClose')
-        )
-        statistics = Statistics(**stats_dict)
-        ai_predictions = AIPredictions(
-            long_term=LongTermPrediction(**long_term_pred_dict),
-            short_term=ShortTermPrediction(**short_term_pred_dict),
-            intraday=IntradayPrediction(**intraday_pred_dict)
-        )
-        news_sentiment = NewsSentiment(
-            stock_news=StockNewsSentiment(**stock_news_dict),
-            global_market=GlobalMarketSentiment(**global_market_dict)
+        # The news looks up the company name itself, so nothing here waits before the two sections start
+        slow, fast = await asyncio.gather(
+            slow_section_cache.get_or_build(
+                f"{symbol}|{start_date}|{end_date}", build_slow_section, symbol, start_date, end_date
+            ),
+            fast_section_cache.get_or_build(symbol, build_fast_section, symbol)
         )
 
-        return AnalysisResponse(
-            stock_info=stock_info, statistics=statistics, ai_predictions=ai_predictions,
-            news_sentiment=news_sentiment, historical_data=historical_data_list,
-            daily_returns_histogram=daily_returns_list
+        # The slow section is cached for an hour; today's price, high and low come from the fast one
+        stock_info = slow["stock_info"]
+        live_bar = fast["live_bar"]
+        if end_date is None and live_bar:
+            stock_info = stock_info.model_copy(update={
+                "currentPrice": live_bar.get("Close"), "dayHigh": live_bar.get("High"), "dayLow": live_bar.get("Low")
+            })
+
+        # Format Full Response
+        # Assembled with model_construct and serialized once by PydanticResponse, so the
+        # response is neither re-validated nor run through jsonable_encoder.
+        response = AnalysisResponse.model_construct(
+            stock_info=stock_info,
+            statistics=slow["statistics"],
+            ai_predictions=AIPredictions.model_construct(
+                long_term=slow["long_term"],
+                short_term=slow["short_term"],
+                intraday=fast["intraday"]
+            ),
+            news_sentiment=NewsSentiment.model_construct(
+                stock_news=fast["stock_news"],
+                global_market=fast["global_market"]
+            ),
+            historical_data=slow["historical_data"],
+            daily_returns_histogram=slow["daily_returns_histogram"]
         )
+        return PydanticResponse(content=response, headers={"Cache-Control": f"public, max-age={FAST_CACHE_TTL}"})
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1,7 +1,9 @@
 # finstock-ai/backend/app/api/websockets.py
 import asyncio
-import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import traceback
+import orjson
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from app.core.serialization import orjson_default
 from app.services import prediction # We'll use our dummy prediction function
 
 # Create a new router just for WebSockets
@@ -10,58 +12,109 @@ router = APIRouter(
     tags=["WebSockets"] # Group this in the docs
 )
 
+INTRADAY_UPDATE_INTERVAL = 5 # Seconds between intraday updates
+
 # This class will manage all active WebSocket connections
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: list[WebSocket] = []
+        self.active_connections: set[WebSocket] = set()
+        # Clients per tracked symbol, and the single background task producing that symbol's updates
+        self.subs: dict[str, set[WebSocket]] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        # discard: O(1), and a second disconnect for the same socket is a no-op
+        self.active_connections.discard(websocket)
+
+    def subscribe(self, symbol: str, websocket: WebSocket):
+        """Adds a client to a symbol's feed, starting the feed if it's the first one."""
+        self.subs.setdefault(symbol, set()).add(websocket)
+        task = self.tasks.get(symbol)
+        if task is None or task.done():
+            # Also restarts a feed whose task has ended
+            task = self.tasks[symbol] = asyncio.create_task(self._pump(symbol))
+            task.add_done_callback(lambda done: self._forget_task(symbol, done))
+
+    def _forget_task(self, symbol: str, task: asyncio.Task):
+        # Only if it's still the symbol's current task (unsubscribe may have replaced or removed it)
+        if self.tasks.get(symbol) is task:
+            del self.tasks[symbol]
+
+    def unsubscribe(self, symbol: str, websocket: WebSocket):
+        """Removes a client from a symbol's feed, stopping the feed when nobody is left."""
+        subscribers = self.subs.get(symbol)
+        if subscribers is None:
+            return
+        subscribers.discard(websocket)
+        if not subscribers:
+            del self.subs[symbol]
+            task = self.tasks.pop(symbol, None)
+            if task:
+                task.cancel()
 
     async def send_json(self, message: dict, websocket: WebSocket):
-        """Sends a JSON message to a single websocket."""
-        await websocket.send_text(json.dumps(message))
+        """Sends a JSON message to a single websocket (binary frame, same format as the feed)."""
+        await websocket.send_bytes(orjson.dumps(message, default=orjson_default))
+
+    async def _pump(self, symbol: str):
+        """
+        Computes one intraday update per interval for a symbol, serializes it once,
+        and sends the same bytes to every subscriber of that symbol.
+        """
+        while True:
+            await asyncio.sleep(INTRADAY_UPDATE_INTERVAL)
+
+            # A failed update skips this tick; letting it escape would end the feed for every subscriber
+            try:
+                pred_data = prediction.get_intraday_prediction(symbol)
+                payload = orjson.dumps({
+                    "type": "intraday_update",
+                    "data": pred_data
+                }, default=orjson_default)
+            except Exception:
+                print(f"Error building intraday update for {symbol}: {traceback.format_exc()}")
+                continue
+
+            # Send concurrently so one slow client doesn't hold up the others
+            subscribers = list(self.subs.get(symbol, ()))
+            results = await asyncio.gather(
+                *(websocket.send_bytes(payload) for websocket in subscribers),
+                return_exceptions=True
+            )
+            for websocket, result in zip(subscribers, results):
+                if isinstance(result, Exception):
+                    print(f"Dropping WebSocket client for {symbol} after failed send: {result}")
+                    self.unsubscribe(symbol, websocket)
 
 # Create a single instance of the manager to use in our endpoint
 manager = ConnectionManager()
 
 
 @router.websocket("/intraday")
-async def websocket_intraday_feed(websocket: WebSocket):
+async def websocket_intraday_feed(
+    websocket: WebSocket,
+    symbol: str = Query("DUMMY.NS", description="Stock symbol to track (e.g., RELIANCE.NS)")
+):
     """
     WebSocket endpoint for the real-time intraday feed.
+    Updates are pushed by the symbol's shared feed task (see ConnectionManager._pump).
     """
     await manager.connect(websocket)
-    
-    # We need to know which stock to "track"
-    # In a real app, the client would send this as the first message
-    # For now, let's just default to a dummy symbol.
-    symbol = "DUMMY.NS" 
+    manager.subscribe(symbol, websocket)
 
     try:
-        # Keep the connection alive, sending dummy data every 5 seconds
+        # Nothing to send from here; just wait until the client goes away
         while True:
-            await asyncio.sleep(5) # Wait for 5 seconds
-            
-            # Get a new dummy prediction
-            pred_data = prediction.get_intraday_prediction(symbol)
-            
-            # Format it as a WebSocket message
-            message = {
-                "type": "intraday_update",
-                "data": pred_data
-            }
-            
-            # Send the new prediction to the client
-            await manager.send_json(message, websocket)
-            
+            await websocket.receive_text()
+
     except WebSocketDisconnect:
         print(f"Client disconnected from WebSocket.")
-        manager.disconnect(websocket)
     except Exception as e:
         print(f"An error occurred in the WebSocket: {e}")
-        manager.disconnect(websocket)
\ No newline at end of file
+    finally:
+        manager.unsubscribe(symbol, websocket)
+        manager.disconnect(websocket)
@@ -0,0 +1,47 @@
+# finstock-ai/backend/app/core/serialization.py
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import orjson
+from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+
+def orjson_default(obj):
+    """
+    Fallback for the types orjson can't serialize on its own
+    (numpy scalars, Decimal, pandas Timestamps).
+    """
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class NumpyORJSONResponse(ORJSONResponse):
+    """
+    ORJSONResponse that also handles numpy/pandas values coming straight out of our services,
+    so endpoints can return plain dicts without a jsonable_encoder pass.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+class PydanticResponse(NumpyORJSONResponse):
+    """
+    Renders a Pydantic model (normally built with model_construct, i.e. unvalidated)
+    with a single model_dump + orjson pass. Uses field aliases like FastAPI's response_model does.
+    """
+    def render(self, content) -> bytes:
+        if isinstance(content, BaseModel):
+            # warnings=False: constructed models may carry numpy arrays, which orjson writes natively
+            content = content.model_dump(by_alias=True, warnings=False)
+        return super().render(content)
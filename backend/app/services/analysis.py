@@ -1,19 +1,222 @@
 # finstock-ai/backend/app/services/analysis.py
+import asyncio
 import yfinance as yf
 import pandas as pd
 import numpy as np # For isnan, isfinite
+from numba import njit
 from fastapi import HTTPException
 import traceback
-from datetime import datetime # For default date logic
+import os
+import functools
+import threading
+import math
+from cachetools import TTLCache, TLRUCache
+from datetime import datetime, time # For default date logic
+from zoneinfo import ZoneInfo
 # Need to import Optional from typing for the new function signature
 from typing import Optional
 
+# Number of bins for the daily returns histogram sent to the dashboard
+RETURN_HISTOGRAM_BINS = 50
+
+# --- Ticker & Info Caches ---
+# yf.Ticker objects hold their own HTTP session and lazily fetched data, so one is kept per symbol
+_TICKERS: dict[str, yf.Ticker] = {}
+_TICKERS_LOCK = threading.Lock()
+
+# Only the fast_info fields the API uses; each one is fetched lazily by yfinance,
+# so iterating all of fast_info would cost several extra requests
+FAST_INFO_FIELDS = ("marketCap", "currency", "exchange")
+INFO_CACHE_TTL = 900 # Seconds; market cap goes stale, the rest doesn't
+_INFO_CACHE = TTLCache(maxsize=512, ttl=INFO_CACHE_TTL)
+_INFO_LOCK = threading.Lock()
+
+# Ranges ending today (they include the live bar) are kept briefly as sliced;
+# closed ranges are cut from the day-cached history, which is cheap
+HIST_CACHE_TTL = 300 # Seconds
+_HIST_CACHE = TTLCache(maxsize=256, ttl=HIST_CACHE_TTL) # (symbol, start, end, through_today) -> DataFrame
+_HIST_LOCK = threading.Lock()
+
+# One lock per symbol, so concurrent requests for a cold symbol download its history only once
+_HISTORY_LOCKS: dict[str, threading.Lock] = {}
+
+# Company profiles don't change, so a fetched one is kept for good; a failed fetch is
+# remembered briefly, so requests in the meantime don't each wait on Yahoo again
+PROFILE_FAILURE_TTL = 120 # Seconds
+_PROFILE_CACHE = TLRUCache(
+    maxsize=512, ttu=lambda symbol, profile, now: now + (math.inf if profile else PROFILE_FAILURE_TTL)
+)
+_PROFILE_LOCK = threading.Lock() # cachetools caches aren't thread-safe
+_PROFILE_LOCKS: dict[str, threading.Lock] = {}
+
+def _ticker(symbol: str) -> yf.Ticker:
+    """Returns the shared yf.Ticker for a symbol, creating it on first use."""
+    with _TICKERS_LOCK:
+        ticker = _TICKERS.get(symbol)
+        if ticker is None:
+            ticker = _TICKERS[symbol] = yf.Ticker(symbol)
+        return ticker
+
+def _history_lock(symbol: str) -> threading.Lock:
+    with _TICKERS_LOCK:
+        return _HISTORY_LOCKS.setdefault(symbol, threading.Lock())
+
+def _profile_lock(symbol: str) -> threading.Lock:
+    with _TICKERS_LOCK:
+        return _PROFILE_LOCKS.setdefault(symbol, threading.Lock())
+
+def get_company_profile(symbol: str) -> dict:
+    """
+    Name, sector and industry from the full (slow) Yahoo quote summary, fetched once per symbol.
+    Returns an empty dict if it can't be fetched; that's cached for PROFILE_FAILURE_TTL, then retried.
+    """
+    # The per-symbol lock makes concurrent callers (e.g. the name lookup and the slow section) share one fetch
+    with _profile_lock(symbol):
+        with _PROFILE_LOCK:
+            profile = _PROFILE_CACHE.get(symbol)
+        if profile is None:
+            try:
+                info = _ticker(symbol).get_info()
+                profile = {key: info.get(key) for key in ("shortName", "longName", "sector", "industry")}
+            except Exception as e:
+                print(f"Warning: could not fetch company profile for {symbol}: {e}")
+                profile = {}
+            with _PROFILE_LOCK:
+                _PROFILE_CACHE[symbol] = profile
+        return dict(profile) # Copy: the cached dict is shared
+
+# --- Local History Cache ---
+# Daily bars before today never change, so each symbol's closed bars are kept on disk
+# as parquet and only the tail is re-downloaded (at most once a day).
+# Today's bar keeps changing while the market is open, so it's fetched separately (see load_live_bars).
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache")
+
+# NSE trading hours; outside them today's bar (if any) no longer moves
+MARKET_TZ = ZoneInfo("Asia/Kolkata")
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+LIVE_BAR_TTL = 120 # Seconds between re-fetches of today's bar while the market is open
+MARKET_CLOSED_TTL = 3600 # ...and while it's closed
+_LIVE_BARS = TLRUCache(maxsize=256, ttu=lambda key, entry, now: now + entry[1]) # (symbol, day) -> (bars, ttl)
+_LIVE_LOCK = threading.Lock()
+
+# history() adjusts every earlier bar for these, so the saved bars must be re-fetched when one shows up
+ADJUSTMENT_EVENTS = ["Dividends", "Stock Splits"]
+
+class _StaleHistory(Exception):
+    """
+    Raised by load_full_history when the refresh fails, with the saved bars as 'hist'.
+    Raising keeps the stale result out of the lru_cache, and the parquet file isn't rewritten,
+    so the next call tries the refresh again.
+    """
+    def __init__(self, symbol: str, hist: pd.DataFrame):
+        super().__init__(f"Could not refresh cached history for {symbol}")
+        self.hist = hist
+
+@functools.lru_cache(maxsize=64)
+def load_full_history(symbol: str, as_of: str) -> pd.DataFrame:
+    """
+    Returns a symbol's closed daily bars: the full history up to, not including, the given day (YYYY-MM-DD).
+    'as_of' is part of the lru_cache key, so each process re-checks a symbol once per day.
+    The returned DataFrame is shared between callers: slice/copy it, never modify it.
+    """
+    def closed_bars(df: pd.DataFrame) -> pd.DataFrame:
+        # Today's bar may still be forming, so it's left to load_live_bars
+        return df[df.index < pd.Timestamp(as_of, tz=df.index.tz)]
+
+    file_path = os.path.join(CACHE_DIR, f"{symbol}.parquet")
+    cached = pd.read_parquet(file_path, engine="pyarrow", memory_map=True) if os.path.exists(file_path) else None
+
+    # Written today already (e.g. by another process): it holds every bar before today
+    if cached is not None and datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d') == as_of:
+        return closed_bars(cached)
+
+    ticker = _ticker(symbol)
+    if cached is None or cached.empty:
+        hist = ticker.history(period="max", interval="1d")
+    else:
+        # Re-fetch from the last cached bar on, in case that bar was still forming when saved
+        last_date = cached.index.max()
+        try:
+            tail = ticker.history(start=last_date.strftime('%Y-%m-%d'), interval="1d")
+            # The request includes last_date itself, so an empty answer means the fetch failed
+            # (yfinance usually reports errors that way rather than raising)
+            if tail.empty:
+                raise ValueError("no rows returned")
+            events = tail.loc[tail.index > last_date, tail.columns.intersection(ADJUSTMENT_EVENTS)]
+            if (events.fillna(0) != 0).to_numpy().any():
+                # The saved bars are on the old adjustment basis, so the whole history is fetched again
+                print(f"Split or dividend in {symbol}'s new bars, re-fetching its full history")
+                hist = ticker.history(period="max", interval="1d")
+                if hist.empty:
+                    raise ValueError("no rows returned for the full history")
+            else:
+                hist = pd.concat([cached[cached.index < tail.index.min()], tail])
+        except Exception as e:
+            print(f"Warning: could not refresh cached history for {symbol}, using cached data: {e}")
+            raise _StaleHistory(symbol, closed_bars(cached)) from e
+    hist = closed_bars(hist)
+
+    if hist.empty:
+        # Raise instead of returning, so lru_cache doesn't keep the empty result for the whole day
+        raise HTTPException(status_code=404, detail=f"No data found for symbol {symbol}")
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    hist.to_parquet(tmp_path, compression="zstd")
+    os.replace(tmp_path, file_path) # Atomic, so readers never see a half-written file
+    return hist
+
+def _live_bar_ttl() -> float:
+    """How long a fetch of today's bar stays fresh: LIVE_BAR_TTL during market hours, longer outside them."""
+    now = datetime.now(MARKET_TZ)
+    if now.weekday() >= 5 or now.time() > MARKET_CLOSE:
+        return MARKET_CLOSED_TTL
+    if now.time() < MARKET_OPEN:
+        # Don't hold an empty pre-open result past the open
+        opens_in = (datetime.combine(now.date(), MARKET_OPEN, MARKET_TZ) - now).total_seconds()
+        return min(MARKET_CLOSED_TTL, max(LIVE_BAR_TTL, opens_in))
+    return LIVE_BAR_TTL
+
+def load_live_bars(symbol: str, as_of: str) -> pd.DataFrame:
+    """
+    Returns the symbol's bar for the given day (empty before the open or on holidays),
+    re-fetched at most every LIVE_BAR_TTL seconds while the market is open.
+    The returned DataFrame is shared between callers: slice/copy it, never modify it.
+    """
+    key = (symbol, as_of)
+    with _LIVE_LOCK:
+        entry = _LIVE_BARS.get(key)
+    if entry is not None:
+        return entry[0]
+    try:
+        # The last two bars, in case today's hasn't started yet
+        recent = _ticker(symbol).history(period="2d", interval="1d")
+        bars = recent[recent.index >= pd.Timestamp(as_of, tz=recent.index.tz)]
+    except Exception as e:
+        # Kept for LIVE_BAR_TTL like any other result, so a failing symbol isn't retried on every request
+        print(f"Warning: could not fetch today's bar for {symbol}: {e}")
+        bars = pd.DataFrame()
+    with _LIVE_LOCK:
+        _LIVE_BARS[key] = (bars, _live_bar_ttl())
+    return bars
+
+def get_live_bar(symbol: str) -> Optional[dict]:
+    """Today's Close/High/Low for a symbol, or None if it hasn't traded today."""
+    bars = load_live_bars(symbol, datetime.now().strftime('%Y-%m-%d'))
+    if bars.empty:
+        return None
+    last = bars.iloc[-1]
+    return {field: float(last[field]) for field in ("Close", "High", "Low") if field in bars.columns}
+
 def get_stock_data(symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
     """
     Fetches historical stock data from yfinance for a given date range.
     Defaults to the last 5 years if no dates are provided.
     """
     try:
+        # A range without an end date runs through today's (possibly still forming) bar
+        through_today = end_date is None
         # --- NEW Date Logic ---
         if end_date is None:
             end_date_dt = datetime.now()
@@ -26,63 +229,181 @@ def get_stock_data(symbol: str, start_date: Optional[str] = None, end_date: Opti
             start_date = (end_date_dt - pd.DateOffset(years=5)).strftime('%Y-%m-%d')
         # --- End New Date Logic ---
         
-        ticker = yf.Ticker(symbol)
-        # Use the provided start/end dates
-        hist = ticker.history(start=start_date, end=end_date, interval="1d")
+        today = datetime.now().strftime('%Y-%m-%d')
+        ends_today = through_today or end_date > today
+        cache_key = (symbol, start_date, end_date, through_today)
+        with _HIST_LOCK:
+            hist = _HIST_CACHE.get(cache_key) if ends_today else None
 
-        if hist.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for symbol {symbol} between {start_date} and {end_date}")
+        if hist is None:
+            # Slice the cached closed bars to [start_date, end_date) - same bounds as ticker.history()
+            stale = False
+            with _history_lock(symbol):
+                try:
+                    full_hist = load_full_history(symbol, today)
+                except _StaleHistory as e:
+                    full_hist, stale = e.hist, True # Only for this call; the next one retries the refresh
+                live_bars = load_live_bars(symbol, today) if ends_today else None
+            start = pd.Timestamp(start_date, tz=full_hist.index.tz)
+            end = pd.Timestamp(end_date, tz=full_hist.index.tz)
+            start_pos = full_hist.index.searchsorted(start)
+            end_pos = len(full_hist) if through_today else full_hist.index.searchsorted(end)
+            hist = full_hist.iloc[start_pos:end_pos]
+            if live_bars is not None and not live_bars.empty:
+                in_range = (live_bars.index >= start) & (through_today or live_bars.index < end)
+                hist = pd.concat([hist, live_bars[in_range].reindex(columns=hist.columns)])
 
-        # Try using fast_info first, fallback to .info
-        try:
-            info = ticker.fast_info.to_dict()
-            if 'symbol' not in info: info['symbol'] = symbol
-        except Exception:
-             print(f"Warning: fast_info failed for {symbol}, falling back to .info (slower)")
-             info = ticker.info
-             if not info:
-                  print(f"Warning: Could not retrieve info dict for {symbol}")
-                  info = {'symbol': symbol}
+            if hist.empty:
+                raise HTTPException(status_code=404, detail=f"No data found for symbol {symbol} between {start_date} and {end_date}")
+            if ends_today and not stale:
+                with _HIST_LOCK:
+                    _HIST_CACHE[cache_key] = hist
+        hist = hist.copy() # Copy: callers may modify their frame, and the cached one is shared
 
-        return hist, info
+        with _INFO_LOCK:
+            info = _INFO_CACHE.get(symbol)
+        if info is None:
+            # fast_info only; names come from stocks.db and sector/industry from get_company_profile()
+            fast_info = _ticker(symbol).fast_info
+            info = {'symbol': symbol}
+            for field in FAST_INFO_FIELDS:
+                try:
+                    info[field] = fast_info[field]
+                except Exception as e:
+                    print(f"Warning: fast_info['{field}'] failed for {symbol}: {e}")
+            with _INFO_LOCK:
+                _INFO_CACHE[symbol] = info
+
+        return hist, dict(info) # Copy: the cached dict is shared
 
     except Exception as e:
         print(f"Detailed yfinance error for {symbol}: {traceback.format_exc()}")
         raise HTTPException(status_code=404, detail=f"Error fetching data from yfinance for {symbol}: {str(e)}")
 
+# --- Async Wrappers ---
+# For FastAPI handlers: the blocking yfinance/disk work runs in a worker thread
+async def aget_stock_data(symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    return await asyncio.to_thread(get_stock_data, symbol, start_date=start_date, end_date=end_date)
 
-def calculate_advanced_probabilities(daily_returns: pd.Series):
-    """Calculates conditional probabilities and streak probabilities."""
-    if daily_returns.empty or len(daily_returns) < 2:
-        return {
-            "prob_down_day": None, "cond_prob_up_given_up": None, "cond_prob_down_given_down": None,
-            "prob_2_days_up_streak": None, "prob_2_days_down_streak": None
-        }
+async def aget_company_profile(symbol: str) -> dict:
+    return await asyncio.to_thread(get_company_profile, symbol)
+
+async def aget_live_bar(symbol: str) -> Optional[dict]:
+    return await asyncio.to_thread(get_live_bar, symbol)
+
+
+# --- Numba Kernels ---
+# fastmath without 'nnan'/'ninf': the kernels deliberately return NaN for inputs that are too short
+_FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _moments(x):
+    """
+    Single pass (Welford/Terriberry) over x returning
+    (mean, sample variance, skewness, excess kurtosis, min, max).
+    Skewness and kurtosis use the same bias-adjusted estimators as pandas .skew()/.kurt().
+    """
+    n = 0
+    mean = 0.0
+    m2 = 0.0
+    m3 = 0.0
+    m4 = 0.0
+    min_val = x[0] if x.size > 0 else np.nan
+    max_val = min_val
+    for i in range(x.size):
+        value = x[i]
+        n1 = n
+        n += 1
+        delta = value - mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term1 = delta * delta_n * n1
+        mean += delta_n
+        m4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6.0 * delta_n2 * m2 - 4.0 * delta_n * m3
+        m3 += term1 * delta_n * (n - 2) - 3.0 * delta_n * m2
+        m2 += term1
+        if value < min_val:
+            min_val = value
+        if value > max_val:
+            max_val = value
+
+    variance = m2 / (n - 1) if n > 1 else np.nan
+    skewness = np.nan
+    kurtosis = np.nan
+    if n > 2:
+        skewness = 0.0 if m2 == 0 else np.sqrt(n * (n - 1.0)) / (n - 2.0) * (m3 / n) / (m2 / n) ** 1.5
+    if n > 3:
+        if m2 == 0:
+            kurtosis = 0.0
+        else:
+            g2 = (m4 / n) / (m2 / n) ** 2 - 3.0
+            kurtosis = ((n + 1.0) * g2 + 6.0) * (n - 1.0) / ((n - 2.0) * (n - 3.0))
+    if n == 0:
+        mean = np.nan
+    return mean, variance, skewness, kurtosis, min_val, max_val
+
+# Sign states used by the transition table
+DOWN, FLAT, UP = 0, 1, 2
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _sign_transitions(r):
+    """
+    Single pass over daily returns classifying each day as DOWN/FLAT/UP (NaN counts as FLAT).
+    Returns (day counts per state, 3x3 table of consecutive-day transitions [yesterday, today]).
+    Branchless: each day's state is computed arithmetically and used as an index.
+    """
+    states = np.zeros(3, dtype=np.int64)
+    transitions = np.zeros((3, 3), dtype=np.int64)
+    if r.size == 0:
+        return states, transitions
+    prev = (r[0] > 0) - (r[0] < 0) + 1
+    states[prev] += 1
+    for i in range(1, r.size):
+        cur = (r[i] > 0) - (r[i] < 0) + 1
+        states[cur] += 1
+        transitions[prev, cur] += 1
+        prev = cur
+    return states, transitions
 
-    returns_shifted = daily_returns.shift(1)
-    is_up = daily_returns > 0
-    was_up = returns_shifted > 0
-    is_down = daily_returns < 0
-    was_down = returns_shifted < 0
-    valid_comparison = pd.notna(daily_returns) & pd.notna(returns_shifted)
-    total_valid_comparison_days = valid_comparison.sum()
 
-    if total_valid_comparison_days == 0:
-        prob_down = (is_down.sum() / len(daily_returns)) * 100 if len(daily_returns) > 0 else 0
+def _quantiles(values: np.ndarray, qs: tuple) -> list:
+    """
+    Linearly interpolated quantiles (numpy's default method) using one np.partition,
+    which places just the needed order statistics in O(n) instead of sorting.
+    """
+    positions = [q * (values.size - 1) for q in qs]
+    lower = [int(position) for position in positions]
+    upper = [min(low + 1, values.size - 1) for low in lower]
+    partitioned = np.partition(values, sorted(set(lower + upper)))
+    return [
+        partitioned[low] + (partitioned[up] - partitioned[low]) * (position - low)
+        for position, low, up in zip(positions, lower, upper)
+    ]
+
+
+def calculate_advanced_probabilities(daily_returns: np.ndarray):
+    """Calculates conditional probabilities and streak probabilities from an array of daily returns."""
+    if daily_returns.size < 2:
         return {
-            "prob_down_day": prob_down, "cond_prob_up_given_up": None, "cond_prob_down_given_down": None,
+            "prob_down_day": None, "cond_prob_up_given_up": None, "cond_prob_down_given_down": None,
             "prob_2_days_up_streak": None, "prob_2_days_down_streak": None
         }
 
-    up_given_up = (is_up & was_up & valid_comparison).sum()
-    down_given_down = (is_down & was_down & valid_comparison).sum()
-    total_was_up = (was_up & valid_comparison).sum()
-    total_was_down = (was_down & valid_comparison).sum()
-    cond_prob_up_given_up = (up_given_up / total_was_up) * 100 if total_was_up > 0 else 0
-    cond_prob_down_given_down = (down_given_down / total_was_down) * 100 if total_was_down > 0 else 0
-    prob_2_days_up = ((is_up & was_up)[valid_comparison]).mean() * 100 if total_valid_comparison_days > 0 else 0
-    prob_2_days_down = ((is_down & was_down)[valid_comparison]).mean() * 100 if total_valid_comparison_days > 0 else 0
-    prob_down_overall = (is_down.sum() / len(daily_returns)) * 100 if len(daily_returns) > 0 else 0
+    returns = np.asarray(daily_returns) # float32 or float64: the kernel compiles for either
+    n_days = returns.size
+    n_pairs = n_days - 1 # Consecutive (yesterday, today) pairs
+    states, transitions = _sign_transitions(returns)
+    down = states[DOWN]
+    was_up = transitions[UP].sum()
+    was_down = transitions[DOWN].sum()
+    up_up = transitions[UP, UP]
+    down_down = transitions[DOWN, DOWN]
+
+    cond_prob_up_given_up = (up_up / was_up) * 100 if was_up > 0 else 0
+    cond_prob_down_given_down = (down_down / was_down) * 100 if was_down > 0 else 0
+    prob_2_days_up = (up_up / n_pairs) * 100
+    prob_2_days_down = (down_down / n_pairs) * 100
+    prob_down_overall = (down / n_days) * 100
 
     return {
         "prob_down_day": prob_down_overall,
@@ -96,57 +417,59 @@ def calculate_advanced_probabilities(daily_returns: pd.Series):
 def calculate_statistics(hist_data: pd.DataFrame):
     """
     Calculates statistical parameters, return distribution, probabilities,
-    and returns the raw daily returns list.
+    and returns the binned daily returns histogram.
     """
     if hist_data.empty or 'Close' not in hist_data.columns:
         raise HTTPException(status_code=500, detail="Invalid historical data for statistics")
 
     # --- Data Cleaning ---
-    if not isinstance(hist_data.index, pd.DatetimeIndex):
+    # Works on a local Close series: hist_data itself is never modified, so callers can share it
+    close_series = pd.to_numeric(hist_data['Close'], errors='coerce')
+    if not isinstance(close_series.index, pd.DatetimeIndex):
          try:
-             hist_data.index = pd.to_datetime(hist_data.index, errors='coerce')
-             hist_data.dropna(axis=0, subset=[hist_data.index.name], inplace=True)
-             if not isinstance(hist_data.index, pd.DatetimeIndex):
+             dates = pd.to_datetime(close_series.index, format='ISO8601', errors='coerce', cache=True)
+             if not isinstance(dates, pd.DatetimeIndex):
                   raise ValueError("Index conversion to DatetimeIndex failed")
+             close_series = close_series.set_axis(dates)[dates.notna()]
          except Exception as e:
               raise HTTPException(status_code=500, detail=f"Could not process date index for stats: {e}")
-    hist_data['Close'] = pd.to_numeric(hist_data['Close'], errors='coerce')
-    hist_data.dropna(axis=0, subset=['Close'], inplace=True)
-    if hist_data.empty:
+    close_series = close_series.dropna()
+    if close_series.empty:
          raise HTTPException(status_code=500, detail="No valid 'Close' data after cleaning")
 
     # --- Basic Stats ---
-    start_date = hist_data.index.min().strftime('%Y-%m-%d')
-    end_date = hist_data.index.max().strftime('%Y-%m-%d')
-    desc = hist_data['Close'].describe()
-    median = hist_data['Close'].median()
-    mode_series = hist_data['Close'].mode()
-    mode = mode_series.iloc[0] if not mode_series.empty else None
-    variance = hist_data['Close'].var()
-    skewness = hist_data['Close'].skew()
-    kurtosis = hist_data['Close'].kurt()
-    mean_val = desc.get('mean', 0)
-    std_val = desc.get('std', 0)
-    min_val = desc.get('min', 0)
-    max_val = desc.get('max', 0)
-    pct_25 = desc.get('25%', 0)
-    pct_75 = desc.get('75%', 0)
+    start_date = close_series.index.min().strftime('%Y-%m-%d')
+    end_date = close_series.index.max().strftime('%Y-%m-%d')
+    close = close_series.to_numpy(dtype=np.float64)
+    # One fused pass for the moments instead of describe()/var()/skew()/kurt() each re-scanning Close
+    mean_val, variance, skewness, kurtosis, min_val, max_val = _moments(close)
+    std_val = np.sqrt(variance)
+    pct_25, median, pct_75 = _quantiles(close, (0.25, 0.5, 0.75))
+    # Not computed: the mode of continuous prices isn't meaningful, and it would need a sort or hash pass
+    mode = None
     range_val = max_val - min_val
     iqr = pct_75 - pct_25
     coeff_var = (std_val / mean_val) * 100 if mean_val else 0
 
     # --- Return Distribution & Probabilities ---
-    daily_returns = hist_data['Close'].pct_change().dropna()
-    prob_rise = (daily_returns > 0).mean() * 100 if not daily_returns.empty else 0
-    adv_probs = calculate_advanced_probabilities(daily_returns)
-    mean_daily_return = daily_returns.mean() * 100 if not daily_returns.empty else 0
-    std_daily_return = daily_returns.std() * 100 if not daily_returns.empty else 0
+    # Same values as pct_change().dropna() (Close has no NaNs here), without the NaN-padded intermediate
+    # Returns are stored as float32 (half the bytes for every pass below). The division is done in
+    # float64 and only the result is rounded, so no return changes sign; sums accumulate in float64.
+    returns = np.empty(max(close.size - 1, 0), dtype=np.float32)
+    np.subtract(close[1:] / close[:-1], 1.0, out=returns, casting='same_kind')
+    adv_probs = calculate_advanced_probabilities(returns)
+    if returns.size > 0:
+        prob_rise = np.count_nonzero(returns > 0) / returns.size * 100
+        mean_daily_return = returns.mean(dtype=np.float64) * 100
+        std_daily_return = returns.std(ddof=1, dtype=np.float64) * 100 if returns.size > 1 else np.nan # Same NaN as pandas .std()
+    else:
+        prob_rise = mean_daily_return = std_daily_return = 0
 
     stats = {
         "start_date": start_date, "end_date": end_date, "mean": mean_val, "median": median,
         "mode": mode, "std_deviation": std_val, "variance": variance, "skewness": skewness,
         "kurtosis": kurtosis, "range": range_val, "iqr": iqr, "min": min_val, "max": max_val,
-        "25_percentile": pct_25, "50_percentile": desc.get('50%', None), "75_percentile": pct_75,
+        "25_percentile": pct_25, "50_percentile": median, "75_percentile": pct_75,
         "coeff_of_variation": coeff_var, "probability_next_day_up": prob_rise,
         "probability_next_day_down": adv_probs.get("prob_down_day"),
         "mean_daily_return_percent": mean_daily_return,
@@ -165,11 +488,18 @@ def calculate_statistics(hist_data: pd.DataFrame):
         else:
             cleaned_stats[k] = v
 
-    # --- Prepare daily returns data for histogram ---
-    daily_returns_list = [
-        round(r * 100, 4) for r in daily_returns.tolist()
-        if pd.notna(r) and np.isfinite(r)
-    ]
+    # --- Bin daily returns for the histogram ---
+    # Only the bin edges (in %) and counts go over the wire, not every daily return
+    returns_pct = returns * np.float32(100)
+    returns_pct = returns_pct[np.isfinite(returns_pct)]
+    if returns_pct.size > 0:
+        counts, bin_edges = np.histogram(returns_pct, bins=RETURN_HISTOGRAM_BINS)
+    else:
+        counts, bin_edges = np.zeros(0), np.zeros(0)
+    returns_histogram = {
+        "bin_edges": bin_edges.astype(np.float32),
+        "counts": counts.astype(np.uint32)
+    }
 
-    return cleaned_stats, daily_returns_list
+    return cleaned_stats, returns_histogram
 
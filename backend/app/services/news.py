@@ -1,7 +1,13 @@
 # finstock-ai/backend/app/services/news.py
-import feedparser # For reading RSS feeds
+import asyncio
+import httpx # For fetching RSS feeds
+from lxml import etree # For parsing them
 import random
-from typing import List, Dict, Any
+import functools
+import re
+import threading
+import time
+from typing import List, Dict, Any, Tuple
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer # For local sentiment analysis
 
 # --- Initialize VADER ---
@@ -12,39 +18,103 @@ analyzer = SentimentIntensityAnalyzer()
 LIVEMINT_MARKET_RSS = "https://www.livemint.com/rss/markets" # General market news
 # We could add more specific feeds if needed, e.g., for specific sectors
 
+# --- RSS Cache ---
+# Every /analyze request reads the same feed (twice: stock news and market news), so the parsed
+# articles are kept for RSS_CACHE_TTL seconds and then revalidated with a conditional GET.
+RSS_CACHE_TTL = 120
+_RSS_CACHE: Dict[str, Dict[str, Any]] = {} # url -> {"articles", "etag", "modified", "fetched_at"}
+_RSS_LOCK = threading.Lock() # Held while fetching, so concurrent callers wait for one download
+
+# One keep-alive client for all feed requests (HTTP/1.1: HTTP/2 would need the extra 'h2' package)
+_client = httpx.Client(
+    timeout=3.0,
+    follow_redirects=True,
+    headers={"User-Agent": "Mozilla/5.0 (compatible; FinStock-AI RSS reader)"}
+)
+# Feeds are plain RSS 2.0; never resolve entities or fetch anything the document points to
+_RSS_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+
 # --- Helper Functions ---
 
+def sentiment_label(compound_score: float) -> str:
+    """Maps a VADER compound score (or an average of them) to Positive/Negative/Neutral."""
+    if compound_score >= 0.05:
+        return "Positive"
+    if compound_score <= -0.05:
+        return "Negative"
+    return "Neutral"
+
+@functools.lru_cache(maxsize=4096)
 def get_sentiment_vader(text: str) -> Dict[str, Any]:
     """
     Analyzes the sentiment of a text string using VADER.
     Returns the compound score and a label (Positive/Negative/Neutral).
+    Cached per text, since the same headlines are scored on every refresh: don't modify the result.
     """
-    vs = analyzer.polarity_scores(text)
-    compound_score = vs['compound']
-    
-    if compound_score >= 0.05:
-        label = "Positive"
-    elif compound_score <= -0.05:
-        label = "Negative"
-    else:
-        label = "Neutral"
-        
-    return {"score": compound_score, "label": label}
+    compound_score = analyzer.polarity_scores(text)['compound']
+    return {"score": compound_score, "label": sentiment_label(compound_score)}
+
+def score_headlines(headlines: List[str]) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Scores a batch of headlines (cached per headline), returning the per-headline
+    sentiment dicts and their average compound score. Expects a non-empty list.
+    """
+    sentiments = [get_sentiment_vader(headline) for headline in headlines]
+    avg_score = sum(sentiment['score'] for sentiment in sentiments) / len(sentiments)
+    return sentiments, avg_score
+
+def _parse_rss(content: bytes) -> List[Dict[str, str]]:
+    """Extracts the feed title and item titles from an RSS 2.0 document."""
+    root = etree.fromstring(content, parser=_RSS_PARSER)
+    if root is None:
+        raise ValueError("Empty or unparseable RSS document")
+    source = (root.findtext('channel/title') or '').strip() or 'RSS Feed'
+    return [{
+        "source": source,
+        "headline": (item.findtext('title') or '').strip() or 'No Title',
+    } for item in root.iterfind('channel/item')]
+
+def _load_rss_articles(feed_url: str) -> List[Dict[str, str]]:
+    """Returns all articles of a feed from the cache, refreshing it once RSS_CACHE_TTL has passed."""
+    with _RSS_LOCK:
+        cached = _RSS_CACHE.get(feed_url)
+        if cached is not None and time.monotonic() - cached["fetched_at"] < RSS_CACHE_TTL:
+            return cached["articles"]
+
+        headers = {}
+        if cached is not None:
+            if cached["etag"]: headers["If-None-Match"] = cached["etag"]
+            if cached["modified"]: headers["If-Modified-Since"] = cached["modified"]
+        try:
+            response = _client.get(feed_url, headers=headers)
+            if cached is not None and response.status_code == 304:
+                # Not modified: keep the parsed articles, restart the TTL
+                cached["fetched_at"] = time.monotonic()
+                return cached["articles"]
+            response.raise_for_status()
+            articles = _parse_rss(response.content)
+        except Exception as e:
+            if cached is None:
+                raise
+            print(f"Error refreshing RSS feed {feed_url}, using cached articles: {e}")
+            cached["fetched_at"] = time.monotonic()
+            return cached["articles"]
+
+        _RSS_CACHE[feed_url] = {
+            "articles": articles,
+            "etag": response.headers.get('ETag'),
+            "modified": response.headers.get('Last-Modified'),
+            "fetched_at": time.monotonic()
+        }
+        return articles
 
 def fetch_rss_feed(feed_url: str, limit: int = 5) -> List[Dict[str, str]]:
     """
-    Fetches and parses an RSS feed, returning a list of articles.
+    Fetches and parses an RSS feed (cached, see _load_rss_articles), returning a list of articles.
     """
     try:
-        feed = feedparser.parse(feed_url)
-        articles = []
-        for entry in feed.entries[:limit]:
-            articles.append({
-                "source": feed.feed.title if 'title' in feed.feed else 'RSS Feed',
-                "headline": entry.title if 'title' in entry else 'No Title',
-                # 'summary': entry.summary if 'summary' in entry else '' # Optional: summary can be noisy
-            })
-        return articles
+        # Copies: callers add sentiment fields to the article dicts
+        return [dict(article) for article in _load_rss_articles(feed_url)[:limit]]
     except Exception as e:
         print(f"Error fetching or parsing RSS feed {feed_url}: {e}")
         return []
@@ -62,9 +132,11 @@ def get_news_and_sentiment(symbol: str, company_name: str) -> Dict[str, Any]:
     all_articles = fetch_rss_feed(LIVEMINT_MARKET_RSS, limit=10)
     
     # Simulate finding articles relevant to the company name
+    # Simple keyword match: first word of the name, anywhere in the headline, any case
+    keyword = re.compile(re.escape(company_name.split()[0]), re.IGNORECASE)
     relevant_articles = [
-        article for article in all_articles 
-        if company_name.split()[0].lower() in article['headline'].lower() # Simple keyword match
+        article for article in all_articles
+        if keyword.search(article['headline'])
     ][:3] # Take top 3 matches
     
     # If no relevant articles found, use the top 2 generic ones
@@ -72,16 +144,12 @@ def get_news_and_sentiment(symbol: str, company_name: str) -> Dict[str, Any]:
         relevant_articles = all_articles[:2]
         
     # Calculate overall sentiment based on relevant headlines
-    total_score = 0
     if relevant_articles:
-        for article in relevant_articles:
-            sentiment = get_sentiment_vader(article['headline'])
+        sentiments, avg_score = score_headlines([article['headline'] for article in relevant_articles])
+        for article, sentiment in zip(relevant_articles, sentiments):
             article['sentiment_score'] = sentiment['score'] # Add score to article dict
             article['sentiment_label'] = sentiment['label']
-            total_score += sentiment['score']
-        
-        avg_score = total_score / len(relevant_articles)
-        overall_sentiment_label = get_sentiment_vader(f"Score {avg_score}")['label'] # Use VADER logic for label
+        overall_sentiment_label = sentiment_label(avg_score)
     else:
         # Fallback if no news found
         relevant_articles.append({
@@ -105,16 +173,10 @@ def get_global_market_sentiment() -> Dict[str, Any]:
     """
     articles = fetch_rss_feed(LIVEMINT_MARKET_RSS, limit=5)
     
-    total_score = 0
-    headlines_only = []
+    headlines_only = [article['headline'] for article in articles] # Just the headlines for the response
     if articles:
-        for article in articles:
-            sentiment = get_sentiment_vader(article['headline'])
-            total_score += sentiment['score']
-            headlines_only.append(article['headline']) # Just collect headlines for the response
-        
-        avg_score = total_score / len(articles)
-        overall_sentiment_label = get_sentiment_vader(f"Score {avg_score}")['label']
+        _, avg_score = score_headlines(headlines_only)
+        overall_sentiment_label = sentiment_label(avg_score)
         # Try to guess a trending topic from the first headline
         trending_topic = headlines_only[0].split('-')[0].split('|')[0].strip() if headlines_only else "Market Update"
 
@@ -128,4 +190,16 @@ def get_global_market_sentiment() -> Dict[str, Any]:
         "trending_topic": trending_topic,
         # "predicted_impact": "N/A", # VADER doesn't provide this
         "key_headlines": headlines_only
-    }
\ No newline at end of file
+    }
+
+
+# --- Async Wrappers ---
+# For FastAPI handlers: the feed download and VADER scoring run in a worker thread
+async def afetch_rss_feed(feed_url: str, limit: int = 5) -> List[Dict[str, str]]:
+    return await asyncio.to_thread(fetch_rss_feed, feed_url, limit)
+
+async def aget_news_and_sentiment(symbol: str, company_name: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(get_news_and_sentiment, symbol, company_name)
+
+async def aget_global_market_sentiment() -> Dict[str, Any]:
+    return await asyncio.to_thread(get_global_market_sentiment)
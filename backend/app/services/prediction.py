@@ -1,103 +1,161 @@
 # finstock-ai/backend/app/services/prediction.py
 import pandas as pd
-import random
-import joblib # To load our saved .pkl files
+import numpy as np
+import joblib # To load .pkl models from older training runs
+import json
 import os
+from datetime import datetime # For the intraday placeholder's timestamp
 
 # --- Parameters ---
 MODEL_DIR = "app/model_store/" # Path from the app/ directory
 
-# --- Helper to Load Models ---
-def load_simple_model(symbol: str, model_type: str) -> float:
+MODEL_TYPES = ("long_term", "short_term")
+MODELS_FILE = "simple_models.json" # All symbols' models in one file
+
+# --- Helpers to Load Models ---
+# The models are single numbers written by the training scripts, so all of them are
+# loaded once into memory instead of reading a file on every prediction.
+_MODELS: dict[tuple[str, str], float] = {} # (symbol, model_type) -> value
+
+def load_all_models() -> dict[tuple[str, str], float]:
     """
-    Loads the saved value from a .pkl file for a given symbol and model type.
-    Returns the loaded value, or 0.0 if the file is not found or fails to load.
+    Loads MODEL_DIR/simple_models.json ({symbol: {model_type: value}}, written by the training scripts).
+    {symbol}_{model_type}.pkl files from older training runs are still read for anything the JSON doesn't have.
+    Files that fail to load are skipped (and predicted as 0.0).
     """
-    file_path = os.path.join(MODEL_DIR, f"{symbol}_{model_type}.pkl")
-    if not os.path.exists(file_path):
-        print(f"   ⚠️ Model file not found: {file_path}. Returning 0.0")
-        return 0.0
+    models = {}
     try:
-        value = joblib.load(file_path)
-        return float(value) # Ensure it's a float
-    except Exception as e:
-        print(f"   ❌ Error loading model file {file_path}: {e}")
+        entries = list(os.scandir(MODEL_DIR))
+    except OSError as e:
+        print(f"   ⚠️ Could not read model directory {MODEL_DIR}: {e}")
+        return models
+
+    for entry in entries:
+        for model_type in MODEL_TYPES:
+            suffix = f"_{model_type}.pkl"
+            if entry.name.endswith(suffix):
+                symbol = entry.name[:-len(suffix)]
+                try:
+                    models[(symbol, model_type)] = float(joblib.load(entry.path)) # Ensure it's a float
+                except Exception as e:
+                    print(f"   ❌ Error loading model file {entry.path}: {e}")
+                break
+
+    models_path = os.path.join(MODEL_DIR, MODELS_FILE)
+    if os.path.exists(models_path):
+        try:
+            with open(models_path, "rb") as f:
+                saved = json.load(f)
+            for symbol, values in saved.items():
+                for model_type in MODEL_TYPES:
+                    if model_type in values:
+                        models[(symbol, model_type)] = float(values[model_type])
+        except Exception as e:
+            print(f"   ❌ Error loading model file {models_path}: {e}")
+    return models
+
+def reload_models():
+    """Re-reads MODEL_DIR, e.g. after the training scripts have written new models."""
+    global _MODELS
+    _MODELS = load_all_models()
+    print(f"Loaded {len(_MODELS)} models from {MODEL_DIR}")
+
+def load_simple_model(symbol: str, model_type: str) -> float:
+    """
+    Returns the saved value for a given symbol and model type, or 0.0 if there is none.
+    """
+    value = _MODELS.get((symbol, model_type))
+    if value is None:
+        print(f"   ⚠️ No {model_type} model for {symbol}. Returning 0.0")
         return 0.0
+    return value
+
+reload_models()
 
 # --- Prediction Functions ---
+# Rules are checked in order, the first match wins; anything else gets the *_DEFAULT.
+LONG_TERM_LABELS = ("Strong Buy Trend", "Positive Trend", "Strong Sell Trend", "Negative Trend")
+LONG_TERM_CONFIDENCES = (0.75, 0.65, 0.75, 0.65)
+LONG_TERM_DEFAULT = ("Neutral Trend", 0.50)
 
-def get_long_term_prediction(hist_data: pd.DataFrame, symbol: str):
+SHORT_TERM_LABELS = ("Buy (Momentum)", "Hold/Weak Buy", "Sell (Momentum)", "Hold/Weak Sell")
+SHORT_TERM_CONFIDENCES = (0.80, 0.60, 0.80, 0.60)
+SHORT_TERM_DEFAULT = ("Hold (Neutral)", 0.50)
+
+def batch_long_term(symbols: list[str], current_prices: np.ndarray) -> list[dict]:
     """
-    Uses the pre-calculated annualized slope (from .pkl) for long-term prediction.
+    Long-term predictions for many symbols at once, from their pre-calculated annualized slopes.
+    current_prices holds each symbol's latest close, in the same order.
     """
-    # Load the pre-calculated slope
-    annualized_slope = load_simple_model(symbol, "long_term")
-
-    # Simple logic based on slope:
-    current_price = hist_data['Close'].iloc[-1]
+    current_prices = np.asarray(current_prices, dtype=np.float64)
+    slopes = np.fromiter((load_simple_model(symbol, "long_term") for symbol in symbols), dtype=np.float64, count=len(symbols))
     # Estimate 1-year target based on current price + annualized slope
-    predicted_target_1y = current_price + annualized_slope
-
-    if annualized_slope > (current_price * 0.05): # If yearly trend > 5% of current price
-        recommendation = "Strong Buy Trend"
-        confidence = 0.75
-    elif annualized_slope > 0:
-        recommendation = "Positive Trend"
-        confidence = 0.65
-    elif annualized_slope < -(current_price * 0.05):
-         recommendation = "Strong Sell Trend"
-         confidence = 0.75
-    elif annualized_slope < 0:
-        recommendation = "Negative Trend"
-        confidence = 0.65
-    else:
-        recommendation = "Neutral Trend"
-        confidence = 0.50
+    targets = current_prices + slopes
 
-    return {
-        "forecast_1y": round(predicted_target_1y, 2), # Changed from dummy random value
+    conditions = [
+        slopes > current_prices * 0.05, # If yearly trend > 5% of current price
+        slopes > 0,
+        slopes < -(current_prices * 0.05),
+        slopes < 0
+    ]
+    recommendations = np.select(conditions, LONG_TERM_LABELS, default=LONG_TERM_DEFAULT[0])
+    confidences = np.select(conditions, LONG_TERM_CONFIDENCES, default=LONG_TERM_DEFAULT[1])
+
+    return [{
+        "forecast_1y": round(target, 2),
         "recommendation": recommendation,
-        "confidence": confidence # Made slightly less random
-    }
+        "confidence": confidence
+    } for target, recommendation, confidence in zip(targets.tolist(), recommendations.tolist(), confidences.tolist())]
 
-def get_short_term_prediction(hist_data: pd.DataFrame, symbol: str):
+def batch_short_term(symbols: list[str]) -> list[dict]:
     """
-    Uses the pre-calculated 30-day momentum (from .pkl) for short-term prediction.
+    Short-term predictions for many symbols at once, from their pre-calculated 30-day momentum (%).
     """
-    # Load the pre-calculated momentum
-    momentum_pct = load_simple_model(symbol, "short_term")
-
-    # Simple logic based on momentum:
-    if momentum_pct > 3.0: # If price increased > 3% in last 30 days
-        recommendation = "Buy (Momentum)"
-        confidence = 0.80
-    elif momentum_pct > 0.5:
-         recommendation = "Hold/Weak Buy"
-         confidence = 0.60
-    elif momentum_pct < -3.0:
-        recommendation = "Sell (Momentum)"
-        confidence = 0.80
-    elif momentum_pct < -0.5:
-        recommendation = "Hold/Weak Sell"
-        confidence = 0.60
-    else:
-        recommendation = "Hold (Neutral)"
-        confidence = 0.50
+    momentum = np.fromiter((load_simple_model(symbol, "short_term") for symbol in symbols), dtype=np.float64, count=len(symbols))
 
-    return {
+    conditions = [
+        momentum > 3.0, # If price increased > 3% in last 30 days
+        momentum > 0.5,
+        momentum < -3.0,
+        momentum < -0.5
+    ]
+    recommendations = np.select(conditions, SHORT_TERM_LABELS, default=SHORT_TERM_DEFAULT[0])
+    confidences = np.select(conditions, SHORT_TERM_CONFIDENCES, default=SHORT_TERM_DEFAULT[1])
+
+    return [{
         "forecast_7d_percent": round(momentum_pct / 4, 2), # Rough guess for 7d based on 30d
         "recommendation": recommendation,
         "confidence": confidence
-    }
+    } for momentum_pct, recommendation, confidence in zip(momentum.tolist(), recommendations.tolist(), confidences.tolist())]
+
+def get_long_term_prediction(hist_data: pd.DataFrame, symbol: str):
+    """
+    Uses the pre-calculated annualized slope (from simple_models.json, or an older .pkl) for long-term prediction.
+    """
+    return batch_long_term([symbol], np.array([hist_data['Close'].iloc[-1]]))[0]
+
+def get_short_term_prediction(hist_data: pd.DataFrame, symbol: str):
+    """
+    Uses the pre-calculated 30-day momentum (from simple_models.json, or an older .pkl) for short-term prediction.
+    """
+    return batch_short_term([symbol])[0]
+
+# --- Intraday Placeholder ---
+_rng = np.random.default_rng()
+PATTERN_MONTHS = ('June', 'July', 'Aug')
+PATTERN_YEARS = (2023, 2024)
+HORIZON_MINUTES = (15, 30)
 
 def get_intraday_prediction(symbol: str):
     """
     Placeholder for the Intraday Similarity Engine.
     Keeps returning dummy data for now.
     """
-    similar_pattern = f"Historical Pattern ({random.choice(['June', 'July', 'Aug'])} {random.randint(2023, 2024)})"
-    outcome_prob = random.uniform(0.60, 0.85)
-    prediction_text = f"Likely {random.uniform(0.1, 0.6):.1f}% {'rise' if random.random() > 0.4 else 'drop'} in next {random.choice([15, 30])} mins"
+    # All the random draws in one call, each in [0, 1)
+    month_u, year_u, prob_u, move_u, direction_u, horizon_u = _rng.random(6).tolist()
+    similar_pattern = f"Historical Pattern ({PATTERN_MONTHS[int(month_u * len(PATTERN_MONTHS))]} {PATTERN_YEARS[int(year_u * len(PATTERN_YEARS))]})"
+    outcome_prob = 0.60 + 0.25 * prob_u
+    prediction_text = f"Likely {0.1 + 0.5 * move_u:.1f}% {'rise' if direction_u > 0.4 else 'drop'} in next {HORIZON_MINUTES[int(horizon_u * len(HORIZON_MINUTES))]} mins"
 
     return {
         "last_updated": datetime.now().strftime("%H:%M:%S"), # Use current time
@@ -105,6 +163,3 @@ def get_intraday_prediction(symbol: str):
         "prediction": prediction_text,
         "probability": round(outcome_prob, 2)
     }
-
-# Need datetime for the intraday placeholder
-from datetime import datetime
\ No newline at end of file
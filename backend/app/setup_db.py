@@ -25,11 +25,24 @@ stocks_to_add = [
     ('LTIM.NS', 'LTIMindtree Ltd.')
 ]
 
+conn = None
 try:
     # Connect to the SQLite database (it will be created if it doesn't exist)
-    conn = sqlite3.connect(DB_PATH)
+    # isolation_level=None: transactions are opened and committed explicitly below
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
     cursor = conn.cursor()
 
+    # WAL lets readers keep going while this script writes; the rest speeds up the build
+    cursor.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    """)
+
+    # Everything below is applied as a single transaction
+    cursor.execute("BEGIN")
+
     # Create the 'stocks' table
     # IF NOT EXISTS prevents errors if you run this script multiple times
     cursor.execute('''
@@ -40,17 +53,30 @@ try:
     ''')
     print("Table 'stocks' created (or already exists).")
 
+    # Case-insensitive indexes for symbol/name lookups (the PRIMARY KEY index is case-sensitive)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stocks_symbol_nocase ON stocks(symbol COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stocks_name_nocase ON stocks(name COLLATE NOCASE)")
+
     # Insert the data
     # executemany is efficient for inserting multiple rows
     # IGNORE ensures that duplicate PRIMARY KEYS (symbols) are skipped
     cursor.executemany("INSERT OR IGNORE INTO stocks (symbol, name) VALUES (?, ?)", stocks_to_add)
 
+    # Drop the full-text table older versions of this script created; /search uses an in-memory index
+    cursor.execute("DROP TABLE IF EXISTS stocks_fts")
+
     # Commit the changes and close the connection
-    conn.commit()
+    cursor.execute("COMMIT")
     print(f"Successfully added {len(stocks_to_add)} stocks to the database.")
 
+    # Fold the WAL back into stocks.db, so the file is complete on its own
+    # (the API opens it read-only and immutable, without looking at the -wal file)
+    cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
 except sqlite3.Error as e:
     print(f"An error occurred: {e}")
+    if conn and conn.in_transaction:
+        conn.rollback()
 
 finally:
     if conn:
@@ -1,11 +1,12 @@
 # finstock-ai/backend/training/1_collect_data.py
-import yfinance as yf
 import pandas as pd
+import numpy as np
 import os
+import re
+import asyncio
+import importlib.util # To check for optional dependencies without importing them
 from datetime import datetime
 
-print("🚀 Starting Data Collection Script...")
-
 # --- Parameters ---
 STOCK_SYMBOLS = [
     'RELIANCE.NS', 'TCS.NS', 'HDFCBANK.NS', 'INFY.NS', 'ICICIBANK.NS',
@@ -15,51 +16,239 @@ STOCK_SYMBOLS = [
 START_DATE = "2010-01-01"
 END_DATE = datetime.now().strftime('%Y-%m-%d')
 DATA_DIR = "../data/daily/" # Relative path from training/ to data/daily/
+DOWNLOAD_THREADS = 8 # Parallel downloads within the batch (the work is waiting on HTTP, not CPU)
+HTTP_CACHE_NAME = "yf_http_cache" # SQLite file (yf_http_cache.sqlite) next to this script
+HTTP_CACHE_EXPIRE = 3600 # Seconds; re-running within the hour doesn't hit Yahoo again
+# yfinance moved to its own curl_cffi session in 0.2.54; from then on it rejects requests_cache sessions
+# ("Caching sessions ... are not supported"), so the HTTP cache is only used with older versions
+HTTP_CACHE_MAX_YF_VERSION = (0, 2, 54)
+ASYNC_DOWNLOAD_THRESHOLD = 50 # Above this many symbols, query Yahoo's chart API directly with aiohttp
+ASYNC_CONNECTIONS = 32 # Simultaneous chart requests on that path
+YF_CHART_URL = "https://query2.finance.yahoo.com/v8/finance/chart/{symbol}"
+
+# --- HTTP Cache ---
+def http_cache_session(yf_version: str):
+    """
+    A requests_cache session for yfinance versions that accept one, otherwise None (yfinance's own session).
+    Newer versions get no HTTP cache; the incremental download already keeps re-runs to the new rows.
+    """
+    version = tuple(int(part) for part in re.findall(r"\d+", yf_version)[:3])
+    if version >= HTTP_CACHE_MAX_YF_VERSION:
+        print(f"yfinance {yf_version} manages its own session, downloading without an HTTP cache.")
+        return None
+    try:
+        import requests_cache # Optional: caches Yahoo's HTTP responses between runs
+    except ImportError:
+        print("requests_cache not installed, downloading without an HTTP cache.")
+        return None
+    print(f"HTTP responses cached in {HTTP_CACHE_NAME}.sqlite for {HTTP_CACHE_EXPIRE}s.")
+    return requests_cache.CachedSession(HTTP_CACHE_NAME, expire_after=HTTP_CACHE_EXPIRE)
 
-print(f"📈 Stocks: {', '.join(STOCK_SYMBOLS)}")
-print(f"📅 Period: {START_DATE} to {END_DATE}")
-print(f"💾 Saving to: {DATA_DIR}")
+# --- Direct Chart-API Download (large symbol lists) ---
+def parse_chart(payload: dict) -> pd.DataFrame:
+    """
+    Converts one chart-API response into the frame yf.download gives for a symbol:
+    Close/High/Low/Open/Volume, adjusted like its auto_adjust default, indexed by trading date.
+    """
+    result = payload["chart"]["result"][0]
+    timestamps = result.get("timestamp")
+    if not timestamps:
+        return pd.DataFrame()
+    quote = result["indicators"]["quote"][0]
+    # Missing values come through as null; np.array turns them into NaN
+    df = pd.DataFrame(
+        {field: np.array(quote[field.lower()], dtype=np.float64) for field in ("Close", "High", "Low", "Open", "Volume")}
+    )
+    adjclose = result["indicators"].get("adjclose")
+    if adjclose:
+        # Scale Open/High/Low by the same factor that turns Close into the adjusted close
+        adjusted = np.array(adjclose[0]["adjclose"], dtype=np.float64)
+        ratio = adjusted / df["Close"].to_numpy()
+        for field in ("High", "Low", "Open"):
+            df[field] *= ratio
+        df["Close"] = adjusted
+    # Timestamps are the session's open; the date in the exchange's timezone is the trading day
+    timezone = result["meta"].get("exchangeTimezoneName", "UTC")
+    df.index = pd.to_datetime(timestamps, unit="s", utc=True).tz_convert(timezone).normalize().tz_localize(None)
+    df.index.name = "Date"
+    return df.dropna(how="all")
 
-# --- Ensure Data Directory Exists ---
-os.makedirs(DATA_DIR, exist_ok=True)
-print("Data directory checked/created.")
+async def fetch_chart(http: "aiohttp.ClientSession", symbol: str, start: str, end: str) -> pd.DataFrame:
+    params = {
+        "period1": int(pd.Timestamp(start, tz="UTC").timestamp()),
+        "period2": int(pd.Timestamp(end, tz="UTC").timestamp()),
+        "interval": "1d",
+        "events": "div,split",
+    }
+    async with http.get(YF_CHART_URL.format(symbol=symbol), params=params) as response:
+        response.raise_for_status()
+        return parse_chart(await response.json())
 
-# --- Fetch and Save Data ---
-failed_symbols = []
-for symbol in STOCK_SYMBOLS:
-    try:
-        print(f"   Fetching daily data for {symbol}...")
-        # Download daily historical data using yfinance
-        hist_daily = yf.download(
-            tickers=symbol,
-            start=START_DATE,
-            end=END_DATE,
-            interval="1d",
-            progress=False # Keep console clean
+async def download_charts(symbols: list, start: str, end: str) -> pd.DataFrame:
+    """
+    Fetches every symbol's chart concurrently (up to ASYNC_CONNECTIONS at a time) over one session.
+    Returns columns (symbol, field) like yf.download(group_by='ticker'); failed symbols are left out.
+    """
+    import aiohttp # Optional dependency, only needed on this path
+
+    connector = aiohttp.TCPConnector(limit=ASYNC_CONNECTIONS)
+    headers = {"User-Agent": "Mozilla/5.0"} # Yahoo rejects requests without a browser-like agent
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as http:
+        results = await asyncio.gather(
+            *(fetch_chart(http, symbol, start, end) for symbol in symbols),
+            return_exceptions=True
         )
+    frames = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            print(f"   ⚠️ Chart request failed for {symbol}: {result}")
+        elif not result.empty:
+            frames[symbol] = result
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+# --- Older CSV Files ---
+def read_saved_csv(file_path: str) -> pd.DataFrame:
+    """
+    Loads a daily CSV written by earlier versions of this script.
+    Rows that don't parse as dates (yfinance's older 'Ticker'/'Date' header rows) are dropped.
+    """
+    df = pd.read_csv(file_path, index_col=0)
+    df.index = pd.to_datetime(df.index, format='ISO8601', cache=True, errors='coerce')
+    df = df[df.index.notna()].apply(pd.to_numeric, errors='coerce')
+    df.index.name = "Date"
+    return df
+
+# --- Collect ---
+def collect() -> dict:
+    """
+    Brings every symbol's daily data up to date on disk (Parquet, for archival and later runs)
+    and returns {symbol: DataFrame} with each symbol's full history, so the training step
+    can use it directly without reading the files back.
+    """
+    print("🚀 Starting Data Collection Script...")
+    print(f"📈 Stocks: {', '.join(STOCK_SYMBOLS)}")
+    print(f"📅 Period: {START_DATE} to {END_DATE}")
+    print(f"💾 Saving to: {DATA_DIR}")
+
+    # --- Ensure Data Directory Exists ---
+    os.makedirs(DATA_DIR, exist_ok=True)
+    print("Data directory checked/created.")
 
-        if not hist_daily.empty:
-            # Clean column names (remove spaces if any, though yfinance usually doesn't have them)
-            #hist_daily.columns = hist_daily.columns.str.replace(' ', '_')
-            # Ensure index is DatetimeIndex
-            hist_daily.index = pd.to_datetime(hist_daily.index)
-
-            # Save to CSV
-            file_path = os.path.join(DATA_DIR, f"{symbol}_daily.csv")
-            hist_daily.to_csv(file_path)
-            print(f"   ✅ Saved {symbol} to {os.path.basename(file_path)}")
-        else:
-            print(f"   ⚠️ No daily data found for {symbol}")
+    # --- Find What's Already on Disk ---
+    existing = {} # symbol -> DataFrame already saved
+    for symbol in STOCK_SYMBOLS:
+        parquet_path = os.path.join(DATA_DIR, f"{symbol}_daily.parquet")
+        csv_path = os.path.join(DATA_DIR, f"{symbol}_daily.csv")
+        try:
+            if os.path.exists(parquet_path):
+                existing[symbol] = pd.read_parquet(parquet_path)
+            elif os.path.exists(csv_path):
+                # One-time migration: the CSV's rows become the start of the Parquet file
+                existing[symbol] = read_saved_csv(csv_path)
+        except Exception as e:
+            print(f"   ⚠️ Could not read saved data for {symbol}, downloading it in full: {e}")
+
+    # Only download from the day after the oldest "last saved date" (START_DATE if any symbol is missing)
+    if len(existing) == len(STOCK_SYMBOLS):
+        fetch_start = (min(df.index.max() for df in existing.values()) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    else:
+        fetch_start = START_DATE
+    print(f"📥 Downloading from {fetch_start} ({len(existing)} of {len(STOCK_SYMBOLS)} symbols already on disk)")
+
+    # --- Fetch and Save Data ---
+    failed_symbols = []
+    collected = {} # symbol -> full daily history (saved rows + new rows)
+    data = pd.DataFrame()
+    download_error = False
+    if fetch_start < END_DATE:
+        # The network libraries are only imported when there is something to download
+        use_charts = False
+        if len(STOCK_SYMBOLS) > ASYNC_DOWNLOAD_THRESHOLD:
+            use_charts = importlib.util.find_spec("aiohttp") is not None # Optional dependency
+            if not use_charts:
+                print("aiohttp not installed, downloading all symbols with yf.download.")
+        try:
+            if use_charts:
+                # Hundreds of symbols: pipeline the chart requests ourselves (not covered by the HTTP cache)
+                print(f"   Fetching daily charts for {len(STOCK_SYMBOLS)} symbols, {ASYNC_CONNECTIONS} at a time...")
+                data = asyncio.run(download_charts(STOCK_SYMBOLS, fetch_start, END_DATE))
+            else:
+                import yfinance as yf
+                session = http_cache_session(yf.__version__)
+                print(f"   Fetching daily data for {len(STOCK_SYMBOLS)} symbols in one batch...")
+                # One batched call for all symbols; yfinance fetches them on DOWNLOAD_THREADS threads
+                # group_by='ticker' gives columns (symbol, field), so each symbol's frame is data[symbol]
+                data = yf.download(
+                    tickers=STOCK_SYMBOLS,
+                    start=fetch_start,
+                    end=END_DATE,
+                    interval="1d",
+                    group_by="ticker",
+                    threads=DOWNLOAD_THREADS,
+                    session=session, # None: yfinance's default session
+                    progress=False # Keep console clean
+                )
+        except Exception as e:
+            print(f"   ❌ Error fetching daily data: {e}")
+            download_error = True
+
+    for symbol in STOCK_SYMBOLS:
+        try:
+            # Parquet keeps the DatetimeIndex and float columns, so step 2 needs no parsing or cleanup
+            file_path = os.path.join(DATA_DIR, f"{symbol}_daily.parquet")
+            if data.empty or symbol not in data.columns.get_level_values(0):
+                hist_daily = pd.DataFrame(index=pd.DatetimeIndex([]))
+            else:
+                # Rows where this symbol didn't trade (but others did) are all-NaN in the batch
+                hist_daily = data[symbol].dropna(how="all")
+                # Ensure index is DatetimeIndex
+                hist_daily.index = pd.to_datetime(hist_daily.index)
+                hist_daily.columns.name = None
+
+            if symbol in existing:
+                # Whatever happens below, what's on disk is still usable
+                collected[symbol] = existing[symbol]
+
+            if symbol in existing and not download_error:
+                saved = existing[symbol]
+                # The batch starts at the oldest last date, so drop what this file already has
+                new_rows = hist_daily[hist_daily.index > saved.index.max()]
+                if new_rows.empty and os.path.exists(file_path):
+                    # Nothing newer than the file (e.g. re-run on the same day or over a weekend)
+                    print(f"   ✔️ {symbol} is up to date (last: {saved.index.max().strftime('%Y-%m-%d')})")
+                    continue
+                # Parquet can't be appended to in place; rewrite the file with the new rows on the end
+                combined = pd.concat([saved, new_rows.reindex(columns=saved.columns)])
+                combined.to_parquet(file_path, compression='snappy')
+                collected[symbol] = combined
+                print(f"   ✅ Added {len(new_rows)} rows to {os.path.basename(file_path)}")
+            elif not hist_daily.empty:
+                hist_daily.to_parquet(file_path, compression='snappy')
+                collected[symbol] = hist_daily
+                print(f"   ✅ Saved {symbol} to {os.path.basename(file_path)}")
+            elif symbol in existing:
+                # The download failed, but the saved rows are still good
+                if not os.path.exists(file_path):
+                    # Still finish the CSV -> Parquet migration
+                    existing[symbol].to_parquet(file_path, compression='snappy')
+                print(f"   ⚠️ Download failed, using saved data for {symbol} (last: {existing[symbol].index.max().strftime('%Y-%m-%d')})")
+            else:
+                print(f"   ⚠️ No daily data found for {symbol}")
+                failed_symbols.append(symbol)
+
+        except Exception as e:
+            print(f"   ❌ Error saving daily data for {symbol}: {e}")
             failed_symbols.append(symbol)
 
-    except Exception as e:
-        print(f"   ❌ Error fetching daily data for {symbol}: {e}")
-        failed_symbols.append(symbol)
-
-# --- Summary ---
-print("\n--- Data Collection Complete ---")
-if failed_symbols:
-    print(f"⚠️ Failed to fetch data for: {', '.join(failed_symbols)}")
-else:
-    print("✅ Successfully fetched and saved data for all symbols.")
-print("------------------------------")
\ No newline at end of file
+    # --- Summary ---
+    print("\n--- Data Collection Complete ---")
+    if failed_symbols:
+        print(f"⚠️ Failed to fetch data for: {', '.join(failed_symbols)}")
+    else:
+        print("✅ Successfully fetched and saved data for all symbols.")
+    print("------------------------------")
+    return collected
+
+
+if __name__ == "__main__":
+    collect()
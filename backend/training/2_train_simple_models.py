@@ -1,66 +1,111 @@
 # finstock-ai/backend/training/2_train_simple_models.py
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression # For long-term trend
-import joblib # For saving the simple "models"
+import json # For saving the simple "models"
 import os
-import glob # To find all the CSV files
+import glob # To find all the data files
+import multiprocessing as mp # Loads the files in parallel
 import traceback # For detailed error logging
 
-print("🚀 Starting Simple Model Training Script...")
-
 # --- Parameters ---
-DATA_DIR = "../data/daily/"       # Where the CSVs are stored
-MODEL_DIR = "../model_store/"     # Where to save the .pkl files
+DATA_DIR = "../data/daily/"       # Where the Parquet (or older CSV) files are stored
+MODEL_DIR = "../model_store/"     # Where to save simple_models.json
 LONG_TERM_YEARS = 5              # Number of years for long-term trend calculation
 SHORT_TERM_DAYS = 30             # Number of days for short-term momentum
-
-print(f"💾 Loading data from: {DATA_DIR}")
-print(f"💾 Saving models to: {MODEL_DIR}")
-print(f"📈 Long-term trend: Last {LONG_TERM_YEARS} years")
-print(f"📈 Short-term momentum: Last {SHORT_TERM_DAYS} days")
-
-# --- Ensure Model Directory Exists ---
-os.makedirs(MODEL_DIR, exist_ok=True)
-print("Model directory checked/created.")
+CLOSE_DTYPE = np.float32          # Half the memory traffic of float64; the math accumulates in float64
 
 # --- Define Simple "Model" Functions ---
 
-def train_long_term_model(df: pd.DataFrame, years: int) -> float:
+# fastmath without 'nnan': the kernel checks for NaN (days a symbol has no price)
+_FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+_window_slopes_jit = None
+
+def _window_slopes(x, series, first_rows):
     """
-    Calculates the slope of the closing price over the last N years using linear regression.
-    Returns the annualized slope (approximate yearly growth trend).
+    Least-squares slope of each row of series (one symbol per row) against x,
+    over columns first_rows[j]: onwards and skipping NaN. Two fused passes per symbol
+    (means, then cov/var) with float64 accumulators, so no temporary arrays.
+    Returns (slopes, points used per symbol); the slope is NaN with fewer than two points.
     """
-    try:
-        # Filter data for the last N years
-        end_date = df.index.max()
-        start_date = end_date - pd.DateOffset(years=years)
-        df_filtered = df[df.index >= start_date].copy()
-
-        if len(df_filtered) < 2: # Need at least two points for regression
-            print(f"   ⚠️ Not enough data for {years}-year trend.")
-            return 0.0
-
-        # Prepare data for Linear Regression
-        # We use days since the start as the independent variable (X)
-        df_filtered['days'] = (df_filtered.index - df_filtered.index.min()).days
-        X = df_filtered[['days']]
-        y = df_filtered['Close']
-
-        # Fit the model
-        model = LinearRegression()
-        model.fit(X, y)
+    n_symbols, n_days = series.shape
+    slopes = np.full(n_symbols, np.nan)
+    counts = np.zeros(n_symbols, dtype=np.int64)
+    for j in range(n_symbols):
+        count = 0
+        sum_x = 0.0
+        sum_y = 0.0
+        for i in range(first_rows[j], n_days):
+            value = series[j, i]
+            if not np.isnan(value):
+                count += 1
+                sum_x += x[i]
+                sum_y += value
+        counts[j] = count
+        if count < 2:
+            continue
+        mean_x = sum_x / count
+        mean_y = sum_y / count
+        cov = 0.0
+        var = 0.0
+        for i in range(first_rows[j], n_days):
+            value = series[j, i]
+            if not np.isnan(value):
+                dx = x[i] - mean_x
+                cov += dx * (value - mean_y)
+                var += dx * dx
+        if var > 0:
+            slopes[j] = cov / var
+    return slopes, counts
+
+def _compiled_window_slopes():
+    """
+    Returns the Numba-compiled _window_slopes, importing numba on first use only:
+    pool workers (which re-import this file when spawned) and runs with no data never need it.
+    """
+    global _window_slopes_jit
+    if _window_slopes_jit is None:
+        from numba import njit
+        _window_slopes_jit = njit(cache=True, fastmath=_FASTMATH)(_window_slopes)
+    return _window_slopes_jit
 
-        # Slope represents price change per day
-        daily_slope = model.coef_[0]
 
-        # Annualize the slope (approximate)
-        annualized_slope = daily_slope * 252 # Assuming ~252 trading days/year
-        return annualized_slope
+def train_long_term_models(frames: dict, years: int) -> dict:
+    """
+    Calculates the least-squares slope of the closing price over each symbol's last N years,
+    for all symbols at once. Returns {symbol: annualized slope (approximate yearly growth trend)}.
+    """
+    slopes = {symbol: 0.0 for symbol in frames}
+    if not frames:
+        return slopes
+    try:
+        # One column per symbol on the union of all trading dates (NaN where a symbol has no row)
+        closes = pd.concat({symbol: df['Close'] for symbol, df in frames.items()}, axis=1).sort_index()
+
+        # Each symbol's window still ends at its own last date: its first row is the first date inside it,
+        # found by binary search on the sorted dates (no mask or copy)
+        starts = np.array(
+            [df.index[-1] - pd.DateOffset(years=years) for df in frames.values()],
+            dtype='datetime64[ns]'
+        )
+        first_rows = closes.index.searchsorted(starts)
+
+        # Days since the first date as the independent variable (the offset cancels out in the slope)
+        x = (closes.index - closes.index[0]).days.to_numpy(dtype=np.float64)
+
+        # Slope represents price change per day; one contiguous row per symbol for the kernel
+        series = np.ascontiguousarray(closes.to_numpy().T)
+        daily_slopes, counts = _compiled_window_slopes()(x, series, first_rows)
+
+        for symbol, count, daily_slope in zip(frames, counts, daily_slopes):
+            if count < 2 or np.isnan(daily_slope): # Need at least two (distinct) points for regression
+                print(f"   ⚠️ Not enough data for {years}-year trend for {symbol}.")
+                continue
+            # Annualize the slope (approximate)
+            slopes[symbol] = float(daily_slope * 252) # Assuming ~252 trading days/year
     except Exception as e:
-        print(f"   ❌ Error calculating long-term trend:")
+        print(f"   ❌ Error calculating long-term trends:")
         traceback.print_exc() # Print full traceback
-        return 0.0
+    return slopes
 
 
 def train_short_term_model(df: pd.DataFrame, days: int) -> float:
@@ -69,13 +114,15 @@ def train_short_term_model(df: pd.DataFrame, days: int) -> float:
     Returns the percentage change.
     """
     try:
-        if len(df) < days:
+        close = df['Close'].to_numpy() # No copy; plain array indexing below
+        if len(close) < days:
             print(f"   ⚠️ Not enough data for {days}-day momentum.")
             return 0.0
 
         # Get the closing price N days ago and the latest price
-        price_n_days_ago = df['Close'].iloc[-days]
-        latest_price = df['Close'].iloc[-1]
+        # float(): Close is float32 (CLOSE_DTYPE); do the percentage math in double precision
+        price_n_days_ago = float(close[-days])
+        latest_price = float(close[-1])
 
         if price_n_days_ago == 0: # Avoid division by zero
             return 0.0
@@ -88,87 +135,173 @@ def train_short_term_model(df: pd.DataFrame, days: int) -> float:
         traceback.print_exc() # Print full traceback
         return 0.0
 
-# --- Find CSV Files ---
-csv_files = glob.glob(os.path.join(DATA_DIR, "*_daily.csv"))
-print(f"\nFound {len(csv_files)} CSV files to process.")
+# --- Data Loading ---
+
+def load_parquet(file_path: str) -> pd.DataFrame:
+    """Loads a Parquet file from 1_collect_data.py; index and dtypes are stored, so no cleaning is needed."""
+    return pd.read_parquet(file_path, columns=['Close'])
 
-# --- Loop Through Files, Train, and Save ---
-failed_models = []
-for file_path in csv_files:
-    symbol = os.path.basename(file_path).replace("_daily.csv", "")
-    print(f"\nProcessing {symbol}...")
+
+def load_csv(file_path: str) -> pd.DataFrame:
+    """
+    Loads the date and Close columns of a CSV from older collection runs (before Parquet).
+    yfinance's three-row header ('Price' / 'Ticker' / 'Date') puts two non-data rows under the column names.
+    """
+    with open(file_path) as f:
+        header = f.readline().rstrip().split(',') # First name is 'Date', or 'Price' in the three-row header
+    close_idx = header.index('Close')
+    # pyarrow parses multithreaded, but only takes a row count for skiprows, so the header is skipped as rows
+    df = pd.read_csv(
+        file_path,
+        engine='pyarrow',
+        header=None,
+        skiprows=3 if header[0] == 'Price' else 1,
+        usecols=[0, close_idx], # Skip Open/High/Low/Volume, which we don't use
+        dtype={close_idx: CLOSE_DTYPE}
+    )
+    df.columns = ['Date', 'Close']
+    # ISO8601 covers dates with or without a time part in one vectorized pass; a malformed row
+    # becomes NaT (and is dropped) instead of failing the file or falling back to per-row inference
+    df['Date'] = pd.to_datetime(df['Date'], format='ISO8601', cache=True, errors='coerce')
+    df.set_index('Date', inplace=True)
+    return df[df.index.notna()]
+
+def load_symbol(symbol: str, file_path: str):
+    """
+    Loads one symbol's data file. Runs in a worker process.
+    Returns the DataFrame, or None if the file can't be read.
+    """
+    print(f"\nLoading {symbol}...")
 
     try:
-        # Load data without automatic date parsing initially
-        df = pd.read_csv(file_path, index_col=0)
-        print(f"   Columns loaded: {df.columns.tolist()}")
-
-        # --- REVISED INDEX CLEANING ---
-        # Reset the index to become a column (likely named 'Date' or similar from CSV)
-        index_col_name = df.index.name if df.index.name is not None else 'Date' # Guess original index name
-        if index_col_name in df.columns: # Avoid conflict if 'Date' already a column
-             index_col_name = f"{index_col_name}_Index"
-        df.reset_index(names=[index_col_name], inplace=True)
-
-        # Convert that column to datetime
-        try:
-             df[index_col_name] = pd.to_datetime(df[index_col_name], format='%Y-%m-%d', errors='coerce')
-        except ValueError:
-             print(f"   ⚠️ Could not parse '{index_col_name}' with specific format, falling back.")
-             df[index_col_name] = pd.to_datetime(df[index_col_name], errors='coerce')
-
-        # Drop rows where the date conversion failed (NaT)
-        df.dropna(subset=[index_col_name], inplace=True)
-
-        # Set the cleaned date column back as the index
-        df.set_index(index_col_name, inplace=True)
-        # --------------------------------
-
-        # Check if index is now correctly DatetimeIndex
-        if not isinstance(df.index, pd.DatetimeIndex):
-             print(f"   ❌ Error: Index could not be converted to DatetimeIndex for {symbol}.")
-             failed_models.append(symbol)
-             continue
-
-        # --- Column cleaning remains the same ---
-        if 'Close' not in df.columns:
-            print(f"   ❌ Error: 'Close' column not found in {symbol}. Available columns: {df.columns.tolist()}")
+        return load_parquet(file_path) if file_path.endswith(".parquet") else load_csv(file_path)
+    except Exception as e:
+        print(f"   ❌ Failed loading {symbol}:") # General catch-all
+        traceback.print_exc() # Print full traceback here too
+        return None
+
+
+def prepare_frame(symbol: str, df: pd.DataFrame):
+    """
+    Validates one symbol's frame and reduces it to a date-sorted CLOSE_DTYPE Close column without NaN.
+    Returns a new DataFrame (the input is left untouched), or None if it can't be used.
+    """
+    # Check if index is now correctly DatetimeIndex
+    if not isinstance(df.index, pd.DatetimeIndex):
+         print(f"   ❌ Error: Index could not be converted to DatetimeIndex for {symbol}.")
+         return None
+
+    # --- Column cleaning remains the same ---
+    if 'Close' not in df.columns:
+        print(f"   ❌ Error: 'Close' column not found in {symbol}. Available columns: {df.columns.tolist()}")
+        return None
+
+    df = df[['Close']].astype({'Close': CLOSE_DTYPE}).dropna()
+    # Keep dates in order once here: the trend window and the momentum look-back index by position
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+
+    if df.empty:
+         print(f"   ⚠️ Empty data for {symbol} after cleaning. Skipping.")
+         return None
+
+    return df
+
+# --- Train ---
+def train(frames: dict, failed_models: list = None) -> dict:
+    """
+    Trains the simple models from {symbol: DataFrame with a DatetimeIndex and a Close column},
+    either loaded from DATA_DIR (see main) or passed straight from 1_collect_data.collect().
+    Saves them to MODEL_DIR/simple_models.json and returns {symbol: {"long_term": ..., "short_term": ...}}.
+    failed_models: symbols that already failed before this step, to include in the summary.
+    """
+    failed_models = list(failed_models or [])
+
+    # --- Ensure Model Directory Exists ---
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    print("Model directory checked/created.")
+
+    # --- Clean Each Frame ---
+    cleaned = {} # symbol -> cleaned DataFrame
+    for symbol, df in frames.items():
+        df = prepare_frame(symbol, df)
+        if df is None:
             failed_models.append(symbol)
-            continue
+        else:
+            cleaned[symbol] = df
 
-        df['Close'] = pd.to_numeric(df['Close'], errors='coerce')
-        df.dropna(axis=0, subset=['Close'], inplace=True)
+    # --- Train and Save ---
+    # "Train" the long-term models for every symbol in one batch
+    print(f"\nFitting {LONG_TERM_YEARS}-year trends for {len(cleaned)} symbols...")
+    long_term_slopes = train_long_term_models(cleaned, LONG_TERM_YEARS)
 
-        if df.empty:
-             print(f"   ⚠️ Empty data for {symbol} after cleaning. Skipping.")
-             failed_models.append(symbol)
-             continue
+    results = {} # symbol -> {"long_term": ..., "short_term": ...}
+    for symbol, df in cleaned.items():
+        print(f"\nProcessing {symbol}...")
 
-        # "Train" simple models
-        long_term_slope = train_long_term_model(df, LONG_TERM_YEARS)
-        short_term_momentum = train_short_term_model(df, SHORT_TERM_DAYS)
+        try:
+            long_term_slope = long_term_slopes[symbol]
+            short_term_momentum = train_short_term_model(df, SHORT_TERM_DAYS)
 
-        # Save the results
-        long_term_model_path = os.path.join(MODEL_DIR, f"{symbol}_long_term.pkl")
-        short_term_model_path = os.path.join(MODEL_DIR, f"{symbol}_short_term.pkl")
+            # We keep the calculated value directly as our "model" artifact
+            results[symbol] = {"long_term": long_term_slope, "short_term": short_term_momentum}
 
-        # We save the calculated value directly as our "model" artifact
-        joblib.dump(long_term_slope, long_term_model_path)
-        joblib.dump(short_term_momentum, short_term_model_path)
+            print(f"   📈 Long-term (annualized slope): {long_term_slope:.2f}")
+            print(f"   📈 Short-term ({SHORT_TERM_DAYS}-day % change): {short_term_momentum:.2f}%")
 
-        print(f"   📈 Long-term (annualized slope): {long_term_slope:.2f}")
-        print(f"   📈 Short-term ({SHORT_TERM_DAYS}-day % change): {short_term_momentum:.2f}%")
-        print(f"   ✅ Saved simple models for {symbol}.")
+        except Exception as e:
+            print(f"   ❌ Failed processing {symbol}:") # General catch-all
+            traceback.print_exc() # Print full traceback here too
+            failed_models.append(symbol)
 
+    # --- Save All Models in One File ---
+    models_path = os.path.join(MODEL_DIR, "simple_models.json")
+    try:
+        with open(models_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Saved simple models for {len(results)} symbols to {models_path}")
     except Exception as e:
-        print(f"   ❌ Failed processing {symbol}:") # General catch-all
-        traceback.print_exc() # Print full traceback here too
-        failed_models.append(symbol)
-
-# --- Summary ---
-print("\n--- Simple Model Training Complete ---")
-if failed_models:
-    print(f"⚠️ Failed to process models for: {', '.join(failed_models)}")
-else:
-    print("✅ Successfully processed and saved simple models for all symbols.")
-print("------------------------------------")
\ No newline at end of file
+        print(f"\n❌ Failed saving {models_path}:")
+        traceback.print_exc()
+        failed_models.extend(results)
+
+    # --- Summary ---
+    print("\n--- Simple Model Training Complete ---")
+    if failed_models:
+        print(f"⚠️ Failed to process models for: {', '.join(failed_models)}")
+    else:
+        print("✅ Successfully processed and saved simple models for all symbols.")
+    print("------------------------------------")
+    return results
+
+# --- Main ---
+def main():
+    print("🚀 Starting Simple Model Training Script...")
+    print(f"💾 Loading data from: {DATA_DIR}")
+    print(f"💾 Saving models to: {MODEL_DIR}")
+    print(f"📈 Long-term trend: Last {LONG_TERM_YEARS} years")
+    print(f"📈 Short-term momentum: Last {SHORT_TERM_DAYS} days")
+
+    # --- Find Data Files ---
+    # Parquet from 1_collect_data.py; a CSV is only used for symbols that have no Parquet file yet
+    data_files = {}
+    for pattern in ("*_daily.csv", "*_daily.parquet"):
+        for file_path in glob.glob(os.path.join(DATA_DIR, pattern)):
+            symbol = os.path.basename(file_path).rsplit("_daily.", 1)[0]
+            data_files[symbol] = file_path
+    print(f"\nFound {len(data_files)} data files to process.")
+
+    # --- Load Each File ---
+    # Parsing is CPU-bound and independent per file, so the files are spread over worker processes
+    processes = max(1, min(os.cpu_count() or 1, len(data_files)))
+    with mp.Pool(processes) as pool:
+        loaded = pool.starmap(load_symbol, data_files.items())
+    failed_models = [symbol for symbol, df in zip(data_files, loaded) if df is None]
+    frames = {symbol: df for symbol, df in zip(data_files, loaded) if df is not None}
+
+    train(frames, failed_models)
+
+
+# Worker processes import this file too (on platforms that spawn them), so only run from the command line
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# finstock-ai/backend/training/run_pipeline.py
+import importlib
+
+# The step scripts' names start with a digit, so they can't be imported with a plain import statement
+collect_data = importlib.import_module("1_collect_data")
+train_simple_models = importlib.import_module("2_train_simple_models")
+
+def main():
+    """
+    Runs both steps in one process: the DataFrames from collect() go straight into train(),
+    instead of being written to DATA_DIR and parsed back. collect() still saves the files for later runs.
+    """
+    frames = collect_data.collect()
+    train_simple_models.train(frames)
+
+
+if __name__ == "__main__":
+    main()
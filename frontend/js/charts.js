@@ -43,7 +43,7 @@ function createOrUpdatePriceChart(historicalData) {
     const ctx = canvas.getContext('2d');
     destroyPriceChart(); // Destroy existing chart first
 
-    if (!historicalData || historicalData.length === 0) {
+    if (!historicalData || !historicalData.dates || historicalData.dates.length === 0) {
         console.warn("No historical data available for price chart.");
         ctx.clearRect(0, 0, canvas.width, canvas.height);
         ctx.fillStyle = 'var(--text-secondary)';
@@ -52,11 +52,10 @@ function createOrUpdatePriceChart(historicalData) {
         return;
     }
 
-    // --- THIS IS THE FIX ---
     // Use 'category' type and just pass the date strings as labels
-    const labels = historicalData.map(point => point.date);
-    const dataPoints = historicalData.map(point => point.close);
-    // --- END FIX ---
+    // The API sends parallel arrays, so they can be handed to Chart.js as-is
+    const labels = historicalData.dates;
+    const dataPoints = historicalData.closes;
 
     const data = {
         labels: labels, // Pass date strings as labels
@@ -129,7 +128,7 @@ function createOrUpdatePriceChart(historicalData) {
     }
 }
 
-function createOrUpdateReturnHistogram(dailyReturns) {
+function createOrUpdateReturnHistogram(histogram) {
     const canvas = document.getElementById('returnHistogramChart');
      if (!canvas) {
          console.error("Canvas element #returnHistogramChart not found!");
@@ -138,7 +137,7 @@ function createOrUpdateReturnHistogram(dailyReturns) {
     const ctx = canvas.getContext('2d');
     destroyHistogramChart();
 
-    if (!dailyReturns || dailyReturns.length === 0) {
+    if (!histogram || !histogram.counts || histogram.counts.length === 0) {
         console.warn("No daily returns data available for histogram.");
         ctx.clearRect(0, 0, canvas.width, canvas.height);
         ctx.fillStyle = 'var(--text-secondary)'; ctx.textAlign = 'center'; ctx.font = '14px sans-serif';
@@ -146,35 +145,11 @@ function createOrUpdateReturnHistogram(dailyReturns) {
         return;
     }
 
-    const minReturn = Math.min(...dailyReturns);
-    const maxReturn = Math.max(...dailyReturns);
-    const numBins = Math.min(20, Math.max(10, Math.ceil(Math.sqrt(dailyReturns.length) / 2)));
-    const range = maxReturn - minReturn;
-    const binWidth = range > 0 ? range / numBins : 1;
-
-    const bins = Array(numBins).fill(0);
-    const labels = Array(numBins);
-    let binEdges = [];
-
-    for (let i = 0; i < numBins; i++) {
-        const binStart = minReturn + i * binWidth;
-        const binEnd = (i === numBins - 1) ? maxReturn : binStart + binWidth;
-        binEdges.push({ start: binStart, end: binEnd });
-        labels[i] = `${binStart.toFixed(2)}%`;
-    }
-
-    dailyReturns.forEach(ret => {
-        if (binWidth === 0) {
-             if (ret === minReturn) bins[0]++;
-             return;
-        }
-        let binIndex = Math.floor((ret - minReturn) / binWidth);
-        binIndex = Math.max(0, Math.min(numBins - 1, binIndex));
-        if (ret === maxReturn && binIndex < numBins -1) {
-             binIndex = numBins - 1;
-        }
-        bins[binIndex]++;
-    });
+    // Binned by the API: counts[i] covers bin_edges[i] to bin_edges[i + 1] (in %)
+    const bins = histogram.counts;
+    const edges = histogram.bin_edges;
+    const labels = bins.map((_, i) => `${edges[i].toFixed(2)}%`);
+    const binEdges = bins.map((_, i) => ({ start: edges[i], end: edges[i + 1] }));
 
     const data = {
         labels: labels,
@@ -167,6 +167,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const wsUrl = `${WS_BASE_URL}/intraday?symbol=${encodeURIComponent(symbol)}`;
         console.log("Connecting to WebSocket:", wsUrl);
         intradaySocket = new WebSocket(wsUrl);
+        intradaySocket.binaryType = 'arraybuffer'; // Updates arrive as binary (UTF-8 JSON) frames
 
         intradaySocket.onopen = (event) => {
             console.log("WebSocket connection opened for:", symbol);
@@ -174,7 +175,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
         intradaySocket.onmessage = (event) => {
              try {
-                const message = JSON.parse(event.data);
+                const text = typeof event.data === 'string' ? event.data : new TextDecoder().decode(event.data);
+                const message = JSON.parse(text);
                 if (message.type === 'intraday_update' && message.data) {
                     updateIntradayWidget(message.data);
                 } else {